@@ -5,9 +5,10 @@
     'author': 'AGB Communication',
     'website': 'https://agbcommunication.com',
     'category': 'Human Resources',
-    'depends': ['base', 'hr', 'hr_attendance'],
+    'depends': ['base', 'hr', 'hr_attendance', 'hr_holidays'],
     'data': [
         'security/ir.model.access.csv',
+        'data/ir_cron.xml',
         'views/attendance_dashboard_templates.xml',
         'views/register_template.xml',
         'views/leave_request_form_template.xml',
@@ -57,9 +57,8 @@ class AttendanceDashboardController(http.Controller):
         # --- Check token from header (for APK) ---
         if not employee_id and 'X-Employee-Token' in request.httprequest.headers:
             token = request.httprequest.headers.get('X-Employee-Token')
-            login_record = request.env['employee.login'].sudo().search([('login_token', '=', token)], limit=1)
-            if login_record:
-                employee_id = login_record.employee_number.id
+            employee_id = request.env['employee.login'].sudo()._authenticate_token(token)
+            if employee_id:
                 request.session['employee_number'] = employee_id
 
         # --- If no valid login, redirect to login page ---
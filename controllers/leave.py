@@ -1,17 +1,55 @@
 import logging
-from odoo import http, fields
+from odoo import http
 from odoo.http import request, Response
 from datetime import datetime, timedelta
 import json
 import base64
-from datetime import datetime
+import hashlib
 from datetime import date
-from dateutil.relativedelta import relativedelta
+from psycopg2.errors import LockNotAvailable, SerializationFailure
 from werkzeug.utils import secure_filename
-from calendar import monthrange
+
+from odoo.addons.AGB_HR.models.leave_submission import MAX_IDEMPOTENCY_KEY_LENGTH
 
 _logger = logging.getLogger(__name__)
 
+MAX_BATCH_EMPLOYEES = 500
+
+# /api/employees output field -> hr.employee field it is read from
+EMPLOYEE_API_FIELDS = {
+    'id': None,
+    'name': 'name',
+    'employee_number': 'employee_number',
+    'department': 'department_id',
+    'job_title': 'job_title',
+}
+EMPLOYEE_PAGE_SIZE = 100
+MAX_EMPLOYEE_PAGE_SIZE = 500
+
+# /api/employees/search
+MIN_TYPEAHEAD_QUERY = 2
+TYPEAHEAD_LIMIT = 10
+MAX_TYPEAHEAD_LIMIT = 50
+
+# Leave history pages, /leave/requests and /api/leave-requests
+LEAVE_HISTORY_PAGE_SIZE = 20
+MAX_LEAVE_HISTORY_PAGE_SIZE = 100
+
+# Ranges accepted by one /api/leave-request/batch call
+MAX_BATCH_LEAVE_ITEMS = 31
+
+# Public holidays sent with the leave form, from today on
+BOOTSTRAP_HOLIDAY_DAYS = 365
+
+# Balances can be projected up to the end of next year (one carry-forward ahead)
+MAX_AS_OF_YEARS_AHEAD = 1
+
+# Approval inbox, /api/leave/approvals
+APPROVAL_PAGE_SIZE = 50
+MAX_APPROVAL_PAGE_SIZE = 200
+MAX_APPROVAL_ACTION_LEAVES = 200
+APPROVAL_ACTIONS = ('approve', 'refuse')
+
 class LeaveController(http.Controller):
     
     @http.route('/leave/balance', type='http', auth='public', website=True, methods=['GET'])
@@ -26,10 +64,7 @@ class LeaveController(http.Controller):
 
         current_year = datetime.now().year
 
-        api_response = self.get_leave_balance_with_tracker(employee_number=employee.id)
-
-        # Use directly (no .get('result'))
-        leave_data = api_response or {}
+        leave_data = self._get_employee_balances(employee)
 
         # Convert dictionary to a list of leave types for template
         balances = []
@@ -53,113 +88,6 @@ class LeaveController(http.Controller):
             'balances': balances,
         })
 
-    # self leave-balance def
-    def get_leave_balance_with_tracker(self, employee_number):
-        try:
-            _logger.info("Called get_leave_balance_with_tracker for employee_number: %s", employee_number)
-
-            if not employee_number:
-                _logger.debug("Missing employee_number in request")
-                return {'success': False, 'error': 'Missing employee_number'}
-
-            today = date.today()
-            current_year = today.year
-            _logger.info("Today's date: %s, Current year: %s", today, current_year)
-
-            # --- Employee check ---
-            employee = self.env['hr.employee'].sudo().search([
-                '|', ('id', '=', employee_number),
-                ('employee_number', '=', employee_number)
-            ], limit=1)
-            if not employee:
-                _logger.debug("No employee found with employee_number: %s", employee_number)
-                return {'success': False, 'error': 'Employee not found'}
-
-            _logger.info("Found employee: %s (ID: %s)", employee.name, employee.id)
-
-            # --- Leave types ---
-            leave_types = [
-                {'name': 'casual', 'display_name': 'Casual Leave'},
-                {'name': 'annual', 'display_name': 'Annual Leave'},
-                {'name': 'medical', 'display_name': 'Medical Leave'},
-                {'name': 'funeral', 'display_name': 'Funeral Leave'},
-                {'name': 'marriage', 'display_name': 'Marriage Leave'},
-                {'name': 'unpaid', 'display_name': 'Unpaid Leave'},
-                {'name': 'maternity', 'display_name': 'Maternity Leave'},
-                {'name': 'paternity', 'display_name': 'Paternity Leave'},
-            ]
-
-            result = {'success': True}
-
-            for leave_type in leave_types:
-                _logger.info("Processing leave type: %s (%s)", leave_type['name'], leave_type['display_name'])
-
-                tracker_record = self.env['hr.leave.tracker'].sudo().search([
-                    ('employee_id', '=', employee.id),
-                    ('leave_type_name', '=', leave_type['display_name']),
-                    ('year', '=', current_year)
-                ], limit=1)
-
-                if tracker_record:
-                    # Use updated tracker logic to compute final leave balances
-                    leave_balance = self._update_existing_record(tracker_record, employee, today)
-
-                    if 'system_taken' not in leave_balance:
-                        leave_balance['system_taken'] = leave_balance.get('taken', 0)
-
-                    # Decide what to store in taken_leaves
-                    if leave_type['display_name'] == 'Annual Leave':
-                        cutoff = date(today.year, 6, 30)
-                        if today > cutoff:
-                            taken_to_store = leave_balance.get('system_taken', 0)
-                        else:
-                            taken_to_store = leave_balance.get('taken', 0)
-                    else:
-                        taken_to_store = leave_balance.get('taken', 0)
-
-                    total_to_check = float(leave_balance.get('total_dynamic') or leave_balance.get('total') or 0)
-                    available_to_store = total_to_check - taken_to_store
-                   
-                    tracker_record.sudo().write({
-                        'taken_leaves': taken_to_store,
-                        'pending_requests': leave_balance.get('pending', 0),
-                        'current_balance': available_to_store,
-                        'annual_carry': leave_balance.get('carried_forward', 0),
-                        'expired_carry': leave_balance.get('expired_carried', 0),
-                        'write_date': fields.Datetime.now(),
-                        'write_uid': self.env.user.id,
-                    })
-
-                    leave_balance['taken'] = taken_to_store
-                    leave_balance['available'] = available_to_store
-                else:
-                    # No tracker: calculate default balance and create record
-                    balance_dict = self._calculate_default_leave_balance(
-                        leave_type['display_name'], employee, today
-                    )
-                    leave_balance = self._create_tracker_record(
-                        employee, leave_type, balance_dict, current_year
-                    )
-
-                # Ensure all numeric fields exist
-                for key in ['total', 'total_dynamic', 'accrued_new', 'taken', 'available',
-                            'pending', 'carried_forward', 'expired_carried']:
-                    leave_balance[key] = leave_balance.get(key) or 0
-
-                total_to_check = float(leave_balance.get('total_dynamic') or leave_balance.get('total') or 0)
-
-                if total_to_check > 0 or leave_balance.get('pending', 0) > 0 or leave_balance.get('taken', 0) > 0:
-                    _logger.info("✅ Final leave_balance for %s: %s", leave_type['display_name'], leave_balance)
-                    result[leave_type['name']] = leave_balance
-                else:
-                    _logger.info("⏩ Skipping %s (no total, no taken, no pending)", leave_type['display_name'])
-
-            return result
-
-        except Exception as e: 
-            _logger.exception("Error in get_leave_balance_with_tracker")
-            return {'success': False, 'error': str(e)}
-
     
     @http.route('/leave/request', type='http', auth='public', website=True, method=['GET','POST'])
     def leave_request_form(self, **kwargs):
@@ -229,13 +157,13 @@ class LeaveController(http.Controller):
                     'page_title': 'My Leave Requests'
                 })
             
-            # Get employee's leave requests
+            # Get employee's leave requests; /api/leave-requests serves them a page at a time
             leave_requests = request.env['hr.leave'].sudo().search([
                 ('employee_id', '=', employee.id)
             ], order='create_date desc')
+            # Prefetch the leave type names the template shows, in one query
+            leave_requests.mapped('holiday_status_id.name')
 
-            
-            
             return request.render('AGB_HR.leave_requests_list_template', {
                 'employee': employee,
                 'leave_requests': leave_requests,
@@ -268,67 +196,7 @@ class LeaveController(http.Controller):
                 _logger.info("No employee found for employee_number: %s", employee_number)
                 return {'success': True, 'result': []}
 
-            gender = (employee.gender or '').lower()
-            marital_status = (employee.marital or '').lower()
-            join_date = employee.join_date
-            lower_tags = [t.lower() for t in employee.category_ids.mapped('name')]
-            today = datetime.today().date()
-
-            # Calculate service duration in months
-            service_months = 0
-            if join_date:
-                delta = relativedelta(today, join_date)
-                service_months = delta.years * 12 + delta.months
-
-            eligible_leaves = []
-
-            # -------------------
-            # Rule 1: Intern/Probation
-            # -------------------
-            if 'intern' in lower_tags or 'probation' in lower_tags:
-                eligible_leaves = ['Unpaid Leave']
-
-            # -------------------
-            # Rule 2: Permanent
-            # -------------------
-            elif 'permanent' in lower_tags:
-                # Always include casual, funeral, unpaid
-                eligible_leaves = ['Casual Leave', 'Funeral Leave', 'Unpaid Leave']
-
-                # Annual leave if service ≥ 12 months
-                if service_months >= 12:
-                    eligible_leaves.append('Annual Leave')
-
-                # Medical leave if service ≥ 6 months
-                if service_months >= 6:
-                    eligible_leaves.append('Medical Leave')
-
-                # Marriage leave if single and service ≥ 12 months
-                if marital_status == 'single' and service_months >= 12:
-                    eligible_leaves.append('Marriage Leave')
-
-                # Maternity/Paternity leave if married
-                if marital_status == 'married':
-                    if gender == 'female':
-                        eligible_leaves.append('Maternity Leave')
-                    elif gender == 'male':
-                        eligible_leaves.append('Paternity Leave')
-
-            # -------------------
-            # Fetch only rule-based leave type records
-            # -------------------
-            time_off_types = request.env['hr.leave.type'].sudo().search([
-                ('name', 'in', eligible_leaves),
-                ('active', '=', True)
-            ])
-
-            result = [{
-                'id': lt.id,
-                'name': lt.name,
-                'color': lt.color or 1,
-                'requires_allocation': lt.requires_allocation,
-                'leave_validation_type': lt.leave_validation_type
-            } for lt in time_off_types]
+            result = self._get_eligible_time_off_types(employee)
 
             _logger.info("[API] Returning rule-based time off types: %s", [t['name'] for t in result])
             return {'success': True, 'result': result}
@@ -340,31 +208,188 @@ class LeaveController(http.Controller):
 
 
     
+    def _get_eligible_time_off_types(self, employee):
+        """Leave types `employee` may request under the company rules (no balances)."""
+        # Rules live in hr.leave.balance and are cached per employee and day
+        type_ids = request.env['hr.leave.balance'].sudo()._get_requestable_leave_type_ids(
+            employee.id, employee.write_date, date.today(),
+        )
+        time_off_types = request.env['hr.leave.type'].sudo().browse(type_ids)
+
+        result = [{
+            'id': lt.id,
+            'name': lt.name,
+            'color': lt.color or 1,
+            'requires_allocation': lt.requires_allocation,
+            'leave_validation_type': lt.leave_validation_type
+        } for lt in time_off_types]
+
+        return result
+
+    @http.route('/api/leave/bootstrap', type='json', auth='public', methods=['POST'], csrf=False)
+    def get_leave_bootstrap(self, **kwargs):
+        """Everything the leave request form needs, in one call.
+
+        Eligible types, balances, the employee's current and upcoming leaves
+        (for client-side overlap hints) and public holidays.
+        """
+        try:
+            params = self._get_json_params(kwargs)
+            employee_number = params.get('employee_number') or request.session.get('employee_number')
+            if not employee_number:
+                return {'success': False, 'error': 'Missing employee_number'}
+
+            employee = request.env['hr.employee'].sudo().search([
+                '|', ('id', '=', employee_number),
+                ('employee_number', '=', employee_number)
+            ], limit=1)
+            if not employee:
+                return {'success': False, 'error': 'Employee not found'}
+
+            today = date.today()
+            leaves = request.env['hr.leave'].sudo().search_read([
+                ('employee_id', '=', employee.id),
+                ('state', 'in', ['confirm', 'validate1', 'validate']),
+                ('request_date_to', '>=', today - timedelta(days=1)),
+            ], ['holiday_status_id', 'request_date_from', 'request_date_to', 'number_of_days', 'state'],
+                order='request_date_from')
+            upcoming_leaves = [{
+                'id': leave['id'],
+                'leave_type': leave['holiday_status_id'] and leave['holiday_status_id'][1],
+                'date_from': leave['request_date_from'] and leave['request_date_from'].isoformat(),
+                'date_to': leave['request_date_to'].isoformat(),
+                'number_of_days': leave['number_of_days'],
+                'state': leave['state'],
+            } for leave in leaves]
+
+            public_holidays = request.env['resource.calendar.leaves'].sudo().search_read([
+                ('resource_id', '=', False),   # Global holidays
+                ('date_from', '<=', today + timedelta(days=BOOTSTRAP_HOLIDAY_DAYS)),
+                ('date_to', '>=', today),
+            ], ['name', 'date_from', 'date_to'], order='date_from')
+            holidays = [{
+                'name': holiday['name'],
+                'date_from': holiday['date_from'].date().isoformat(),
+                'date_to': holiday['date_to'].date().isoformat(),
+            } for holiday in public_holidays]
+
+            return {
+                'success': True,
+                'result': {
+                    'employee': {
+                        'id': employee.id,
+                        'employee_number': employee.employee_number or '',
+                        'name': employee.name,
+                    },
+                    'time_off_types': self._get_eligible_time_off_types(employee),
+                    'balances': self._get_employee_balances(employee),
+                    'upcoming_leaves': upcoming_leaves,
+                    'holidays': holidays,
+                },
+            }
+
+        except Exception as e:
+            _logger.exception("Error in get_leave_bootstrap")
+            return {'success': False, 'error': str(e)}
+
     @http.route('/api/employees', type='json', auth='public', methods=['POST'], csrf=False)
-    def get_employees(self):
-        """Get all active employees"""
+    def get_employees(self, **kwargs):
+        """Active employees, a page at a time, ordered by name.
+
+        Params: `limit`, `cursor` (the previous page's next_cursor), `search`
+        (name or employee number) and `fields` (subset of EMPLOYEE_API_FIELDS).
+        """
         try:
-            employees = request.env['hr.employee'].sudo().search([
-                ('active', '=', True)
-            ])
-            
+            params = self._get_json_params(kwargs)
+            limit = min(int(params.get('limit') or EMPLOYEE_PAGE_SIZE), MAX_EMPLOYEE_PAGE_SIZE)
+            fields_wanted = params.get('fields') or list(EMPLOYEE_API_FIELDS)
+            if isinstance(fields_wanted, str):
+                fields_wanted = fields_wanted.split(',')
+            fields_wanted = [name.strip() for name in fields_wanted if name.strip() in EMPLOYEE_API_FIELDS]
+            if not fields_wanted:
+                return {'success': False, 'error': f'fields must be among {", ".join(EMPLOYEE_API_FIELDS)}'}
+
+            domain = [('active', '=', True)]
+            search = (params.get('search') or '').strip()
+            if search:
+                domain += ['|', ('name', 'ilike', search), ('employee_number', 'ilike', search)]
+            cursor = params.get('cursor')
+            if cursor:
+                try:
+                    last_name, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+                except Exception:
+                    return {'success': False, 'error': 'Invalid cursor'}
+                # Keyset: strictly after the last row of the previous page
+                domain += ['|', ('name', '>', last_name), '&', ('name', '=', last_name), ('id', '>', last_id)]
+
+            read_fields = {'name'}
+            read_fields.update(EMPLOYEE_API_FIELDS[name] for name in fields_wanted if EMPLOYEE_API_FIELDS[name])
+            rows = request.env['hr.employee'].sudo().search_read(
+                domain, list(read_fields), order='name, id', limit=limit + 1,
+            )
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+
+            department_names = {}
+            if 'department' in fields_wanted:
+                department_ids = {row['department_id'][0] for row in rows if row['department_id']}
+                department_names = {
+                    department['id']: department['name']
+                    for department in request.env['hr.department'].sudo().browse(department_ids).read(['name'])
+                }
+
             result = []
-            for employee in employees:
-                result.append({
-                    'id': employee.id,
-                    'name': employee.name,
-                    'employee_number': employee.employee_number or f'EMP{employee.id:03d}',
-                    'department': employee.department_id.name if employee.department_id else '',
-                    'job_title': employee.job_title or ''
-                })
-            
-            return {'success': True, 'result': result}
-            
+            for row in rows:
+                values = {
+                    'id': row['id'],
+                    'name': row['name'],
+                    'employee_number': row.get('employee_number') or f"EMP{row['id']:03d}",
+                    'department': department_names.get(row['department_id'][0], '') if row.get('department_id') else '',
+                    'job_title': row.get('job_title') or '',
+                }
+                result.append({name: values[name] for name in fields_wanted})
+
+            next_cursor = None
+            if has_more:
+                next_cursor = base64.urlsafe_b64encode(json.dumps([rows[-1]['name'], rows[-1]['id']]).encode()).decode()
+
+            return {'success': True, 'result': result, 'next_cursor': next_cursor}
+
         except Exception as e:
             _logger.exception("Error fetching employees: %s", str(e))
             return {'success': False, 'error': str(e)}
-    
-    
+
+
+    @http.route('/api/employees/search', type='json', auth='public', methods=['POST'], csrf=False)
+    def search_employees(self, **kwargs):
+        """Typeahead: active employees whose name or employee number contains `query`.
+
+        Served by the trigram indexes installed on hr_employee.
+        """
+        try:
+            params = self._get_json_params(kwargs)
+            query = (params.get('query') or '').strip()
+            if len(query) < MIN_TYPEAHEAD_QUERY:
+                return {'success': True, 'result': []}
+            limit = min(int(params.get('limit') or TYPEAHEAD_LIMIT), MAX_TYPEAHEAD_LIMIT)
+
+            rows = request.env['hr.employee'].sudo().search_read([
+                ('active', '=', True),
+                '|', ('name', 'ilike', query), ('employee_number', 'ilike', query),
+            ], ['name', 'employee_number'], order='name, id', limit=limit)
+
+            result = [{
+                'id': row['id'],
+                'name': row['name'],
+                'employee_number': row['employee_number'] or '',
+            } for row in rows]
+            return {'success': True, 'result': result}
+
+        except Exception as e:
+            _logger.exception("Error searching employees: %s", str(e))
+            return {'success': False, 'error': str(e)}
+
+
     @http.route('/api/leave-request', type='http', auth='public', methods=['POST'], csrf=False)
     def create_leave_request(self, **post):
         try:
@@ -391,48 +416,31 @@ class LeaveController(http.Controller):
             date_to = datetime.strptime(data['request_date_to'], '%Y-%m-%d').date()
             if date_from > date_to:
                 return request.make_response(json.dumps({'success': False, 'error': 'From date cannot be after to date'}), headers=[('Content-Type', 'application/json')])
-            
-
-            request_date_from_period = data.get('request_date_from_period') or False
+            if not self._get_leave_duration(employee, date_from, date_to, data):
+                return self._json_response({'success': False, 'error': 'The selected dates have no working days'})
 
-            number_of_days = float(data.get('number_of_days') or 1)
-            request_unit_half = data.get('half_day') == 'on'
+            idempotency_key, fingerprint, error = self._get_idempotency_key(data)
+            if error:
+                return self._json_response({'success': False, 'error': error})
 
-            leave_values = {
-                'reason': data['reason'],
-                'employee_id': employee.id,
-                'holiday_status_id': leave_type.id,
-                'request_date_from': date_from,
-                'request_date_to': date_to,
-                'number_of_days': number_of_days,
-                'state': 'confirm',
-                'request_unit_half': request_unit_half,
-                'request_unit_hours': False,
-                'request_date_from_period': request_date_from_period,
-            }
+            # Held until commit: no other submission of this employee can slip in between check and create
+            reply, errors = request.env['hr.leave'].sudo()._begin_submission(
+                employee, [(date_from, date_to, leave_type)], idempotency_key, fingerprint,
+            )
+            if reply is not None:
+                if reply.get('success'):
+                    request.session['last_leave_request'] = reply['data']
+                return self._json_response(reply)
+            if errors[0]:
+                return self._json_response({'success': False, 'error': errors[0]})
 
-            if request.env.user.id != request.env.ref('base.public_user').id:
-                leave_values['user_id'] = request.env.user.id
+            leave_values = self._prepare_leave_values(employee, leave_type, date_from, date_to, data['reason'], data)
+            number_of_days = leave_values['number_of_days']
 
             leave_request = request.env['hr.leave'].sudo().create(leave_values)
 
-            if 'attachment' in files:
-                uploaded_file = files['attachment']
-                filename = secure_filename(uploaded_file.filename)
-                file_content = uploaded_file.read()
-                if filename and file_content:
-                    request.env['ir.attachment'].sudo().create({
-                        'name': filename,
-                        'datas': base64.b64encode(file_content),
-                        'res_model': 'hr.leave',
-                        'res_id': leave_request.id,
-                        'type': 'binary',
-                        'mimetype': uploaded_file.mimetype,
-                    })
-            
-            _logger.info("DEBUG: Triggering first approval email for leave %s", leave_request.id)
-            leave_request._compute_approvers()
-            leave_request._send_first_approval_notification()
+            self._attach_uploaded_files(leave_request, files)
+            self._notify_first_approvers(leave_request)
 
             result_data = {
                 'leave_id': leave_request.id,
@@ -449,34 +457,219 @@ class LeaveController(http.Controller):
 
             _logger.info("NANG: result_data: %s", result_data)
 
-            return request.make_response(json.dumps({
+            reply = {
                 'success': True,
                 'message': 'Leave request submitted successfully',
                 'data': result_data
-            }), headers=[('Content-Type', 'application/json')])
+            }
+            if idempotency_key:
+                request.env['hr.leave.submission.key'].sudo()._store_reply(employee, idempotency_key, fingerprint, reply)
+            return self._json_response(reply)
 
+        except (SerializationFailure, LockNotAvailable):
+            # Another submission of the employee committed since this one started: Odoo retries the request with a fresh snapshot
+            raise
         except Exception as e:
             _logger.exception("Leave submission error: %s", str(e))
             request.env.cr.rollback()
             return request.make_response(json.dumps({'success': False, 'error': str(e)}), headers=[('Content-Type', 'application/json')])
 
-    
-    def _calculate_leave_days(self, date_from, date_to, leave_type):
-        """Calculate the number of leave days, excluding weekends if configured"""
+
+    @http.route('/api/leave-request/batch', type='http', auth='public', methods=['POST'], csrf=False)
+    def create_leave_requests_batch(self, **post):
+        """Submit several leave ranges at once, all or nothing.
+
+        Form fields: employee_number, reason, an optional attachment, and
+        `items`, a JSON list of {holiday_status_id, request_date_from,
+        request_date_to, half_day, request_date_from_period}; the days are
+        counted here from the employee's working schedule.
+        Every item is checked against the employee's leaves and the other
+        items; nothing is created unless all are valid. The reply has one
+        result per item, in order.
+        """
         try:
-            # Basic calculation - can be enhanced based on company calendar
-            total_days = (date_to - date_from).days + 1
-        
-            return max(total_days, 0)
-            
+            data = request.params
+            files = request.httprequest.files
+
+            for field in ['employee_number', 'reason', 'items']:
+                if not data.get(field):
+                    return self._json_response({'success': False, 'error': f'Missing required field: {field}'})
+            try:
+                items = json.loads(data['items'])
+            except ValueError:
+                return self._json_response({'success': False, 'error': 'items must be a JSON list'})
+            if not isinstance(items, list) or not items:
+                return self._json_response({'success': False, 'error': 'items must be a non-empty JSON list'})
+            if len(items) > MAX_BATCH_LEAVE_ITEMS:
+                return self._json_response({'success': False, 'error': f'At most {MAX_BATCH_LEAVE_ITEMS} items per request'})
+
+            employee = request.env['hr.employee'].sudo().search([('employee_number', '=', data['employee_number'])], limit=1)
+            if not employee:
+                return self._json_response({'success': False, 'error': 'Employee not found'})
+
+            type_ids = {int(item['holiday_status_id']) for item in items
+                        if isinstance(item, dict) and str(item.get('holiday_status_id') or '').isdigit()}
+            leave_types = request.env['hr.leave.type'].sudo().browse(type_ids).exists()
+
+            # --- Parse every item, then check them all in one pass ---
+            results, ranges, valid_items = [], [], []
+            for index, item in enumerate(items):
+                error = None
+                try:
+                    leave_type = leave_types.filtered(lambda lt: lt.id == int(item['holiday_status_id']))
+                    date_from = datetime.strptime(item['request_date_from'], '%Y-%m-%d').date()
+                    date_to = datetime.strptime(item['request_date_to'], '%Y-%m-%d').date()
+                except (KeyError, TypeError, ValueError):
+                    error = 'holiday_status_id, request_date_from and request_date_to (YYYY-MM-DD) are required'
+                else:
+                    if not leave_type:
+                        error = 'Leave type not found'
+                    elif date_from > date_to:
+                        error = 'From date cannot be after to date'
+                    elif not self._get_leave_duration(employee, date_from, date_to, item):
+                        error = 'The selected dates have no working days'
+                results.append({'index': index, 'success': not error, 'error': error})
+                if not error:
+                    ranges.append((date_from, date_to, leave_type))
+                    valid_items.append((index, item))
+
+            idempotency_key, fingerprint, error = self._get_idempotency_key(data)
+            if error:
+                return self._json_response({'success': False, 'error': error})
+
+            # Held until commit: no other submission of this employee can slip in between check and create
+            reply, range_errors = request.env['hr.leave'].sudo()._begin_submission(
+                employee, ranges, idempotency_key, fingerprint,
+            )
+            if reply is not None:
+                return self._json_response(reply)
+            for (index, _item), error in zip(valid_items, range_errors):
+                if error:
+                    results[index].update(success=False, error=error)
+
+            if not all(result['success'] for result in results):
+                return self._json_response({'success': False, 'error': 'Some items are not valid', 'results': results})
+
+            # --- Create everything at once ---
+            vals_list = [
+                self._prepare_leave_values(employee, leave_type, date_from, date_to, data['reason'], item)
+                for (date_from, date_to, leave_type), (_index, item) in zip(ranges, valid_items)
+            ]
+            leaves = request.env['hr.leave'].sudo().create(vals_list)
+            self._attach_uploaded_files(leaves, files)
+            self._notify_first_approvers(leaves)
+
+            for (index, _item), leave in zip(valid_items, leaves):
+                results[index].update({
+                    'leave_id': leave.id,
+                    'leave_type': leave.holiday_status_id.name,
+                    'date_from': leave.request_date_from.strftime('%Y-%m-%d'),
+                    'date_to': leave.request_date_to.strftime('%Y-%m-%d'),
+                    'number_of_days': leave.number_of_days,
+                    'state': leave.state,
+                })
+                results[index].pop('error')
+
+            reply = {
+                'success': True,
+                'message': f'{len(leaves)} leave requests submitted successfully',
+                'results': results,
+            }
+            if idempotency_key:
+                request.env['hr.leave.submission.key'].sudo()._store_reply(employee, idempotency_key, fingerprint, reply)
+            return self._json_response(reply)
+
+        except (SerializationFailure, LockNotAvailable):
+            # Another submission of the employee committed since this one started: Odoo retries the request with a fresh snapshot
+            raise
         except Exception as e:
-            _logger.error("Error calculating leave days: %s", str(e))
-            return (date_to - date_from).days + 1
-    
+            _logger.exception("Batch leave submission error: %s", str(e))
+            request.env.cr.rollback()
+            return self._json_response({'success': False, 'error': str(e)})
+
+    def _get_json_params(self, kwargs):
+        """Parameters of a JSON route: the JSON-RPC `params`, or the top level of a plain JSON body."""
+        params = dict(request.jsonrequest or {})
+        params.update(kwargs)
+        return params
+
+    def _json_response(self, payload):
+        return request.make_response(json.dumps(payload), headers=[('Content-Type', 'application/json')])
+
+    def _get_idempotency_key(self, data):
+        """(key, fingerprint, error) of a submission's Idempotency-Key header or idempotency_key field.
+
+        The fingerprint hashes the submitted form fields, so a key reused for
+        different dates or types is refused instead of replaying a stale reply.
+        """
+        key = (request.httprequest.headers.get('Idempotency-Key') or data.get('idempotency_key') or '').strip()
+        if not key:
+            return None, None, None
+        if len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+            return None, None, f'Idempotency key is longer than {MAX_IDEMPOTENCY_KEY_LENGTH} characters'
+        submitted = {name: value for name, value in data.items()
+                     if name != 'idempotency_key' and isinstance(value, str)}
+        fingerprint = hashlib.sha256(json.dumps(submitted, sort_keys=True).encode()).hexdigest()
+        return key, fingerprint, None
+
+    def _prepare_leave_values(self, employee, leave_type, date_from, date_to, reason, data):
+        """hr.leave values of a submitted range; `data` holds its optional form fields."""
+        leave_values = {
+            'reason': reason,
+            'employee_id': employee.id,
+            'holiday_status_id': leave_type.id,
+            'request_date_from': date_from,
+            'request_date_to': date_to,
+            'number_of_days': self._get_leave_duration(employee, date_from, date_to, data),
+            'state': 'confirm',
+            'request_unit_half': data.get('half_day') in ('on', True),
+            'request_unit_hours': False,
+            'request_date_from_period': data.get('request_date_from_period') or False,
+        }
+
+        if request.env.user.id != request.env.ref('base.public_user').id:
+            leave_values['user_id'] = request.env.user.id
+        return leave_values
+
+    def _attach_uploaded_files(self, leaves, files):
+        """Attach the uploaded file to every leave, reading it once."""
+        if 'attachment' not in files:
+            return
+        uploaded_file = files['attachment']
+        filename = secure_filename(uploaded_file.filename)
+        file_content = uploaded_file.read()
+        if not filename or not file_content:
+            return
+        datas = base64.b64encode(file_content)
+        request.env['ir.attachment'].sudo().create([{
+            'name': filename,
+            'datas': datas,
+            'res_model': 'hr.leave',
+            'res_id': leave.id,
+            'type': 'binary',
+            'mimetype': uploaded_file.mimetype,
+        } for leave in leaves])
+
+    def _notify_first_approvers(self, leaves):
+        """Set the approvers now, queue the e-mail for the notification cron."""
+        _logger.info("DEBUG: Queueing first approval email for leaves %s", leaves.ids)
+        leaves._compute_approvers()
+        request.env['hr.leave.notification'].sudo()._enqueue(leaves)
+
+    def _get_leave_duration(self, employee, date_from, date_to, data):
+        """Working days of a submitted range, computed here whatever `number_of_days` the client sent."""
+        half_day = data.get('half_day') in ('on', True)
+        return request.env['hr.leave'].sudo()._get_request_duration(employee, date_from, date_to, half_day)
+
     @http.route('/api/leave-requests', type='json', auth='user', methods=['GET'], csrf=False)
-    def get_my_leave_requests(self):
-        """Get leave requests for the logged-in employee"""
+    def get_my_leave_requests(self, **kwargs):
+        """Get leave requests for the logged-in employee, a page at a time.
+
+        Params: `page` (from 1), `limit`, `state` (one or a list), `date_from`
+        and `date_to` (YYYY-MM-DD, leaves overlapping that window).
+        """
         try:
+            params = self._get_json_params(kwargs)
             # Find the employee linked to the logged-in user
             employee = request.env['hr.employee'].sudo().search([
                 ('user_id', '=', request.env.user.id)
@@ -485,30 +678,205 @@ class LeaveController(http.Controller):
             if not employee:
                 return {'success': False, 'error': 'Employee not linked to this user'}
 
-            # Get leave requests
-            leave_requests = request.env['hr.leave'].sudo().search([
-                ('employee_id', '=', employee.id)
-            ], order='create_date desc')
+            domain, page, limit, error = self._get_leave_history_query(employee, params)
+            if error:
+                return {'success': False, 'error': error}
+
+            # Get one page of leave requests, only the fields returned
+            Leave = request.env['hr.leave'].sudo()
+            total = Leave.search_count(domain)
+            rows = Leave.search_read(domain, [
+                'name', 'holiday_status_id', 'request_date_from', 'request_date_to',
+                'number_of_days', 'state', 'create_date',
+            ], order='create_date desc', limit=limit, offset=(page - 1) * limit)
+
+            type_ids = {row['holiday_status_id'][0] for row in rows if row['holiday_status_id']}
+            type_names = {
+                leave_type['id']: leave_type['name']
+                for leave_type in request.env['hr.leave.type'].sudo().browse(type_ids).read(['name'])
+            }
 
             result = []
-            for leave in leave_requests:
+            for row in rows:
                 result.append({
-                    'id': leave.id,
-                    'name': leave.name,
-                    'leave_type': leave.holiday_status_id.name,
-                    'date_from': leave.request_date_from.strftime('%Y-%m-%d') if leave.request_date_from else '',
-                    'date_to': leave.request_date_to.strftime('%Y-%m-%d') if leave.request_date_to else '',
-                    'number_of_days': leave.number_of_days,
-                    'state': leave.state,
-                    'create_date': leave.create_date.strftime('%Y-%m-%d %H:%M:%S') if leave.create_date else ''
+                    'id': row['id'],
+                    'name': row['name'],
+                    'leave_type': type_names.get(row['holiday_status_id'][0], '') if row['holiday_status_id'] else '',
+                    'date_from': row['request_date_from'].strftime('%Y-%m-%d') if row['request_date_from'] else '',
+                    'date_to': row['request_date_to'].strftime('%Y-%m-%d') if row['request_date_to'] else '',
+                    'number_of_days': row['number_of_days'],
+                    'state': row['state'],
+                    'create_date': row['create_date'].strftime('%Y-%m-%d %H:%M:%S') if row['create_date'] else ''
                 })
 
-            return {'success': True, 'result': result}
+            return {'success': True, 'result': result, 'pager': self._get_leave_history_pager(page, limit, total)}
 
         except Exception as e:
             _logger.exception("Error fetching leave requests: %s", str(e))
             return {'success': False, 'error': str(e)}
 
+    def _get_leave_history_query(self, employee, params):
+        """(domain, page, limit, error) for a page of `employee`'s leave history."""
+        domain = [('employee_id', '=', employee.id)]
+        try:
+            page = max(int(params.get('page') or 1), 1)
+            limit = min(max(int(params.get('limit') or LEAVE_HISTORY_PAGE_SIZE), 1), MAX_LEAVE_HISTORY_PAGE_SIZE)
+        except (TypeError, ValueError):
+            return domain, 1, LEAVE_HISTORY_PAGE_SIZE, 'page and limit must be numbers'
+
+        states = params.get('state')
+        if states:
+            if isinstance(states, str):
+                states = states.split(',')
+            domain.append(('state', 'in', states))
+        try:
+            if params.get('date_from'):
+                domain.append(('request_date_to', '>=', datetime.strptime(params['date_from'], '%Y-%m-%d').date()))
+            if params.get('date_to'):
+                domain.append(('request_date_from', '<=', datetime.strptime(params['date_to'], '%Y-%m-%d').date()))
+        except (TypeError, ValueError):
+            return domain, page, limit, 'Dates must be in string format: YYYY-MM-DD'
+        return domain, page, limit, None
+
+    def _get_leave_history_pager(self, page, limit, total):
+        return {
+            'page': page,
+            'limit': limit,
+            'total': total,
+            'page_count': (total + limit - 1) // limit,
+        }
+
+    @http.route('/api/leave/approvals', type='json', auth='user', methods=['POST'], csrf=False)
+    def get_pending_approvals(self, **kwargs):
+        """Leaves waiting for the logged-in user's approval, a page at a time.
+
+        Those naming the user as first approver (pending) or second approver
+        (second approval), and any pending leave of the employees they manage.
+        Params: `page` (from 1), `limit`.
+        """
+        try:
+            params = self._get_json_params(kwargs)
+            try:
+                page = max(int(params.get('page') or 1), 1)
+                limit = min(max(int(params.get('limit') or APPROVAL_PAGE_SIZE), 1), MAX_APPROVAL_PAGE_SIZE)
+            except (TypeError, ValueError):
+                return {'success': False, 'error': 'page and limit must be numbers'}
+
+            Leave = request.env['hr.leave'].sudo()
+            domain = self._get_approval_domain()
+            total = Leave.search_count(domain)
+            rows = Leave.search_read(domain, [
+                'employee_id', 'holiday_status_id', 'request_date_from', 'request_date_to',
+                'number_of_days', 'state', 'reason', 'create_date',
+            ], order='request_date_from, id', limit=limit, offset=(page - 1) * limit)
+
+            # Employees of the whole page in one read
+            employee_ids = {row['employee_id'][0] for row in rows if row['employee_id']}
+            employees = {
+                employee['id']: employee
+                for employee in request.env['hr.employee'].sudo().browse(employee_ids).read(
+                    ['name', 'employee_number', 'department_id'])
+            }
+
+            result = []
+            for row in rows:
+                employee = employees.get(row['employee_id'] and row['employee_id'][0]) or {}
+                result.append({
+                    'id': row['id'],
+                    'employee': {
+                        'id': employee.get('id'),
+                        'name': employee.get('name', ''),
+                        'employee_number': employee.get('employee_number') or '',
+                        'department': employee['department_id'][1] if employee.get('department_id') else '',
+                    },
+                    'leave_type': row['holiday_status_id'][1] if row['holiday_status_id'] else '',
+                    'date_from': row['request_date_from'].strftime('%Y-%m-%d') if row['request_date_from'] else '',
+                    'date_to': row['request_date_to'].strftime('%Y-%m-%d') if row['request_date_to'] else '',
+                    'number_of_days': row['number_of_days'],
+                    'state': row['state'],
+                    'reason': row['reason'] or '',
+                    'create_date': row['create_date'].strftime('%Y-%m-%d %H:%M:%S') if row['create_date'] else '',
+                })
+
+            return {'success': True, 'result': result, 'pager': self._get_leave_history_pager(page, limit, total)}
+
+        except Exception as e:
+            _logger.exception("Error fetching pending approvals: %s", str(e))
+            return {'success': False, 'error': str(e)}
+
+    @http.route('/api/leave/approvals/action', type='json', auth='user', methods=['POST'], csrf=False)
+    def act_on_approvals(self, **kwargs):
+        """Approve or refuse several leaves from the inbox, all or none.
+
+        Body: {"action": "approve" | "refuse", "leave_ids": [...]}. Every leave
+        must be waiting for the user's approval. Leave trackers are refreshed
+        once for all of them after the action.
+        """
+        try:
+            params = self._get_json_params(kwargs)
+            action = params.get('action')
+            leave_ids = params.get('leave_ids') or []
+            if action not in APPROVAL_ACTIONS:
+                return {'success': False, 'error': "action must be 'approve' or 'refuse'"}
+            if not isinstance(leave_ids, list) or not leave_ids:
+                return {'success': False, 'error': 'leave_ids must be a non-empty list'}
+            if len(leave_ids) > MAX_APPROVAL_ACTION_LEAVES:
+                return {'success': False, 'error': f'At most {MAX_APPROVAL_ACTION_LEAVES} leaves per call'}
+            try:
+                leave_ids = {int(leave_id) for leave_id in leave_ids}
+            except (TypeError, ValueError):
+                return {'success': False, 'error': 'leave_ids must be numbers'}
+
+            Leave = request.env['hr.leave'].sudo()
+            leaves = Leave.search(self._get_approval_domain() + [('id', 'in', list(leave_ids))])
+            not_pending = sorted(leave_ids - set(leaves.ids))
+            if not_pending:
+                return {
+                    'success': False,
+                    'error': 'Some leaves are not waiting for your approval',
+                    'leave_ids': not_pending,
+                }
+
+            changes = set()
+            with request.env.cr.savepoint():
+                leaves = leaves.with_context(deferred_leave_changes=changes)
+                if action == 'approve':
+                    first_approvals = leaves.filtered(lambda leave: leave.state == 'confirm')
+                    if first_approvals:
+                        first_approvals.action_approve()
+                    if leaves - first_approvals:
+                        (leaves - first_approvals).action_validate()
+                else:
+                    leaves.action_refuse()
+                Leave._leaves_changed(changes)
+
+            return {
+                'success': True,
+                'result': [{'id': leave.id, 'state': leave.state} for leave in leaves],
+            }
+
+        except Exception as e:
+            _logger.exception("Error applying approval action: %s", str(e))
+            return {'success': False, 'error': str(e)}
+
+    def _get_approval_domain(self):
+        """hr.leave domain of the leaves waiting for the logged-in user's approval."""
+        user = request.env.user
+        employees = user.employee_ids
+
+        def approver_ids(field_name):
+            # The approver fields may point to users or to employees
+            comodel = request.env['hr.leave']._fields[field_name].comodel_name
+            return employees.ids if comodel == 'hr.employee' else user.ids
+
+        return [
+            ('employee_id', 'not in', employees.ids),
+            '|', '|',
+            '&', ('state', '=', 'confirm'), ('first_approver_id', 'in', approver_ids('first_approver_id')),
+            '&', ('state', '=', 'validate1'), ('second_approver_ids', 'in', approver_ids('second_approver_ids')),
+            '&', ('state', 'in', ['confirm', 'validate1']), ('employee_id.parent_id.user_id', '=', user.id),
+        ]
+
     @http.route('/api/check/leave/valid', type='json', auth='public', methods=['POST'], csrf=False)
     def check_leave_valid(self, **kwargs):
         try:
@@ -518,10 +886,6 @@ class LeaveController(http.Controller):
             request_date_to = data.get('request_date_to')
             leave_type_id = data.get('holiday_status_id')
 
-            leave_type = request.env['hr.leave.type'].sudo().browse(int(leave_type_id)) if leave_type_id else None
-            leave_type_name = leave_type.name if leave_type and leave_type.exists() else 'N/A'
-
-            _logger.info('leave_type_name: %s', leave_type_name)
             _logger.info("Debug: received data for leave validation: %s", data)
 
             # --- Validate input ---
@@ -540,207 +904,35 @@ class LeaveController(http.Controller):
             if not employee:
                 return {'success': False, 'error': 'Employee not found'}
 
-            # --- Check overlapping leaves ---
-            overlapping_leaves = request.env['hr.leave'].sudo().search([
-                ('employee_id', '=', employee.id),
-                ('state', 'in', ['confirm', 'validate', 'validate1']),
-                ('request_date_from', '<=', date_to),
-                ('request_date_to', '>=', date_from)
-            ])
+            # --- Overlapping leaves, and adjacent ones for casual leave ---
+            leave_type = request.env['hr.leave.type'].sudo().browse(int(leave_type_id) if leave_type_id else [])
+            error = request.env['hr.leave'].sudo()._check_request_range(employee, date_from, date_to, leave_type)
+            if error:
+                return {'success': False, 'error': error}
 
-            if overlapping_leaves:
-                errors = []
-                state_labels = {'confirm': 'Pending', 'validate1': 'Second Approval', 'validate': 'Approved'}
-                for leave in overlapping_leaves:
-                    state_label = state_labels.get(leave.state, leave.state)
-                    from_str = leave.request_date_from.isoformat() if leave.request_date_from else 'N/A'
-                    to_str = leave.request_date_to.isoformat() if leave.request_date_to else 'N/A'
-
-                    if leave.request_date_from == leave.request_date_to:
-                        errors.append(f"Date {from_str} is already taken as {leave.holiday_status_id.display_name} and it's now in {state_label} state")
-                    else:
-                        errors.append(f"Date ({from_str} → {to_str}) is already taken as {leave.holiday_status_id.display_name} and it's now in {state_label} state")
-
-                return {'success': False, 'error': "; ".join(errors)}
-
-            # --- Check adjacent leaves only if current leave is casual ---
-            if leave_type_name.lower() == 'casual leave':
-                # Check leave before start date
-                before_leaves = request.env['hr.leave'].sudo().search([
-                    ('employee_id', '=', employee.id),
-                    ('state', 'in', ['confirm', 'validate', 'validate1']),
-                    ('request_date_to', '=', date_from - timedelta(days=1))
-                ])
-
-                if before_leaves:
-                    errors = []
-                    for leave in before_leaves:
-                        if leave.request_date_from == leave.request_date_to:
-                            errors.append(f"{leave.request_date_from.strftime('%b %d')} is taken as {leave.holiday_status_id.display_name}")
-                        else:
-                            errors.append(f"{leave.request_date_from.strftime('%b %d')} to {leave.request_date_to.strftime('%b %d')} are taken as {leave.holiday_status_id.display_name}")
-
-                    return {
-                        'success': False,
-                        'error': "; ".join(errors) + " — Casual leave cannot be combined with any other leave before the requested start date"
-                    }
-
-                # Check leave after end date
-                after_leaves = request.env['hr.leave'].sudo().search([
-                    ('employee_id', '=', employee.id),
-                    ('state', 'in', ['confirm', 'validate', 'validate1']),
-                    ('request_date_from', '=', date_to + timedelta(days=1))
-                ])
-
-                if after_leaves:
-                    errors = []
-                    for leave in after_leaves:
-                        if leave.request_date_from == leave.request_date_to:
-                            errors.append(f"{leave.request_date_from.strftime('%b %d')} is taken as {leave.holiday_status_id.display_name}")
-                        else:
-                            errors.append(f"{leave.request_date_from.strftime('%b %d')} to {leave.request_date_to.strftime('%b %d')} are taken as {leave.holiday_status_id.display_name}")
-
-                    return {
-                        'success': False,
-                        'error': "; ".join(errors) + " — Casual leave cannot be combined with any other leave after the requested end date"
-                    }
+            # --- Working days, as the submission will count them ---
+            number_of_days = self._get_leave_duration(employee, date_from, date_to, data)
+            if not number_of_days:
+                return {'success': False, 'error': 'The selected dates have no working days'}
 
             # --- Everything is valid ---
-            return {'success': True}
+            return {'success': True, 'number_of_days': number_of_days}
 
         except Exception as e:
             _logger.error("ERROR - Exception in check_leave_valid: %s", e)
             return {'success': False, 'error': str(e)}
 
-            
-
-    # @http.route('/api/leave-balance', type='json', auth='public', methods=['POST'], csrf=False)
-    # def get_leave_balance_with_tracker(self, **kwargs):
-    #     try:
-    #         _logger.info("Called /api/leave-balance with kwargs: %s", kwargs)
-
-    #         # --- Employee check ---
-    #         employee_number = kwargs.get('employee_number') or request.session.get('employee_number')
-    #         if not employee_number:
-    #             _logger.debug("Missing employee_number in request")
-    #             return {'success': False, 'error': 'Missing employee_number'}
-
-    #         today = date.today()
-    #         current_year = today.year
-    #         _logger.info("Today's date: %s, Current year: %s", today, current_year)
-
-    #         employee = request.env['hr.employee'].sudo().search([
-    #             '|', ('id', '=', employee_number),
-    #             ('employee_number', '=', employee_number)
-    #         ], limit=1)
-    #         if not employee:
-    #             _logger.debug("No employee found with employee_number: %s", employee_number)
-    #             return {'success': False, 'error': 'Employee not found'}
-
-    #         _logger.info("Found employee: %s (ID: %s)", employee.name, employee.id)
-
-    #         # --- Leave types ---
-    #         leave_types = [
-    #             {'name': 'casual', 'display_name': 'Casual Leave'},
-    #             {'name': 'annual', 'display_name': 'Annual Leave'},
-    #             {'name': 'medical', 'display_name': 'Medical Leave'},
-    #             {'name': 'funeral', 'display_name': 'Funeral Leave'},
-    #             {'name': 'marriage', 'display_name': 'Marriage Leave'},
-    #             {'name': 'unpaid', 'display_name': 'Unpaid Leave'},
-    #             {'name': 'maternity', 'display_name': 'Maternity Leave'},
-    #             {'name': 'paternity', 'display_name': 'Paternity Leave'},
-    #         ]
-
-    #         result = {'success': True}
-
-    #         for leave_type in leave_types:
-    #             _logger.info("Processing leave type: %s (%s)", leave_type['name'], leave_type['display_name'])
-
-    #             tracker_record = request.env['hr.leave.tracker'].sudo().search([
-    #                 ('employee_id', '=', employee.id),
-    #                 ('leave_type_name', '=', leave_type['display_name']),
-    #                 ('year', '=', current_year)
-    #             ], limit=1)
-
-    #             if tracker_record:
-    #                 # Use updated tracker logic to compute final leave balances
-    #                 leave_balance = self._update_existing_record(tracker_record, employee, today)
-
-    #                 # --- Ensure system_taken is always present ---
-    #                 if 'system_taken' not in leave_balance:
-    #                     leave_balance['system_taken'] = leave_balance.get('taken', 0)
-
-    #                 # --- Decide what to store in taken_leaves ---
-    #                 if leave_type['display_name'] == 'Annual Leave':
-    #                     cutoff = date(today.year, 6, 30)
-    #                     if today > cutoff:
-    #                         taken_to_store = leave_balance.get('system_taken', 0)
-    #                     else:
-    #                         taken_to_store = leave_balance.get('taken', 0)
-    #                 else:
-    #                     taken_to_store = leave_balance.get('taken', 0)
-
-    #                 # --- Recalculate available as total - taken_to_store ---
-    #                 total_to_check = float(leave_balance.get('total_dynamic') or leave_balance.get('total') or 0)
-    #                 available_to_store = total_to_check - taken_to_store
-
-    #                 tracker_record.sudo().write({
-    #                     'taken_leaves': taken_to_store,
-    #                     'pending_requests': leave_balance.get('pending', 0),
-    #                     'current_balance': available_to_store,
-    #                     'annual_carry': leave_balance.get('carried_forward', 0),
-    #                     'expired_carry': leave_balance.get('expired_carried', 0),
-    #                     'write_date': fields.Datetime.now(),
-    #                     'write_uid': request.env.user.id,
-    #                     # total_allocation left unchanged
-    #                 })
-
-    #                 # Sync response dict
-    #                 leave_balance['taken'] = taken_to_store
-    #                 leave_balance['available'] = available_to_store
-
-    #             else:
-    #                 # No tracker: calculate default balance and create record
-    #                 balance_dict = self._calculate_default_leave_balance(
-    #                     leave_type['display_name'], employee, today
-    #                 )
-    #                 leave_balance = self._create_tracker_record(
-    #                     employee, leave_type, balance_dict, current_year
-    #                 )
-
-    #             # --- Ensure all numeric fields exist and are not None ---
-    #             for key in ['total', 'total_dynamic', 'accrued_new', 'taken', 'available', 'pending', 'carried_forward', 'expired_carried']:
-    #                 leave_balance[key] = leave_balance.get(key) or 0
-
-    #             total_to_check = float(leave_balance.get('total_dynamic') or leave_balance.get('total') or 0)
-
-    #             if total_to_check > 0 or leave_balance.get('pending', 0) > 0 or leave_balance.get('taken', 0) > 0:
-    #                 _logger.info("✅ Final leave_balance for %s: %s", leave_type['display_name'], leave_balance)
-    #                 result[leave_type['name']] = leave_balance
-                    
-    #             else:
-    #                 _logger.info("⏩ Skipping %s (no total, no taken, no pending)", leave_type['display_name'])
-
-    #         return result
-
-    #     except Exception as e:
-    #         _logger.exception("Error in get_leave_balance_with_tracker")
-    #         return {'success': False, 'error': str(e)}
-
-
     @http.route('/api/leave-balance', type='json', auth='public', methods=['POST'], csrf=False)
     def get_leave_balance_with_tracker(self, **kwargs):
         try:
-            _logger.info("Called /api/leave-balance with kwargs: %s", kwargs)
+            params = self._get_json_params(kwargs)
+            _logger.info("Called /api/leave-balance with params: %s", params)
 
             # --- Employee check ---
-            employee_number = kwargs.get('employee_number') or request.session.get('employee_number')
+            employee_number = params.get('employee_number') or request.session.get('employee_number')
             if not employee_number:
                 return {'success': False, 'error': 'Missing employee_number'}
 
-            today = date.today()
-            current_year = today.year
-
             employee = request.env['hr.employee'].sudo().search([
                 '|', ('id', '=', employee_number),
                 ('employee_number', '=', employee_number)
@@ -750,83 +942,19 @@ class LeaveController(http.Controller):
 
             _logger.info("Found employee: %s (ID: %s)", employee.name, employee.id)
 
-            # --- Leave types ---
-            leave_types = [
-                {'name': 'casual', 'display_name': 'Casual Leave'},
-                {'name': 'annual', 'display_name': 'Annual Leave'},
-                {'name': 'medical', 'display_name': 'Medical Leave'},
-                {'name': 'funeral', 'display_name': 'Funeral Leave'},
-                {'name': 'marriage', 'display_name': 'Marriage Leave'},
-                {'name': 'unpaid', 'display_name': 'Unpaid Leave'},
-                {'name': 'maternity', 'display_name': 'Maternity Leave'},
-                {'name': 'paternity', 'display_name': 'Paternity Leave'},
-            ]
-
-            result = {'success': True}
-
-            for leave_type in leave_types:
-                _logger.info("Processing leave type: %s (%s)", leave_type['name'], leave_type['display_name'])
-
-                # --- Calculate eligibility based on current employee data ---
-                balance_dict = self._calculate_default_leave_balance(
-                    leave_type['display_name'], employee, today
-                )
-
-                # If not eligible (everything is zero), skip
-                if not balance_dict or (
-                    balance_dict.get('total', 0) == 0
-                    and balance_dict.get('pending', 0) == 0
-                    and balance_dict.get('taken', 0) == 0
-                ):
-                    _logger.info("⏩ Skipping %s (not eligible)", leave_type['display_name'])
-                    continue
-
-                # --- Find or create tracker ---
-                tracker_record = request.env['hr.leave.tracker'].sudo().search([
-                    ('employee_id', '=', employee.id),
-                    ('leave_type_name', '=', leave_type['display_name']),
-                    ('year', '=', current_year)
-                ], limit=1)
-
-                if tracker_record:
-                    leave_balance = self._update_existing_record(tracker_record, employee, today)
-
-                    # --- ✅ Ensure system_taken is stored in DB ---
-                    if 'system_taken' in leave_balance:
-                        tracker_record.sudo().write({
-                            'system_taken': leave_balance['system_taken']
-                        })
-                else:
-                    leave_balance = self._create_tracker_record(
-                        employee, leave_type, balance_dict, current_year
-                    )
-
-
-                # --- Ensure all numeric fields exist ---
-                for key in ['total','total_dynamic','accrued_new','taken','available','pending','carried_forward','expired_carried','final_taken']:
-                    leave_balance[key] = leave_balance.get(key) or 0
-
-                # --- Special logic for Annual Leave after cutoff date ---
-                if leave_type['name'] == 'annual':
-                    cutoff_date = date(today.year, 6, 30)
-                    if today > cutoff_date:
-                        _logger.info("⚙️ Applying post-cutoff logic for Annual Leave (after June 30)")
-                        # Replace available with total_dynamic - final_taken
-                        leave_balance['available'] = float(leave_balance.get('total_dynamic', 0)) - float(leave_balance.get('system_taken', 0))
-                        
-                        _logger.info(" ✅-> Recalculated available: %s", leave_balance['available'])
-                        # Ensure available isn't negative
-                        # if leave_balance['available'] < 0:
-                        #     leave_balance['available'] = 0
-
-                total_to_check = float(leave_balance.get('total_dynamic') or leave_balance.get('total') or 0)
-
-                if total_to_check > 0 or leave_balance.get('pending', 0) > 0 or leave_balance.get('taken', 0) > 0:
-                    _logger.info("✅ Final leave_balance for %s: %s", leave_type['display_name'], leave_balance)
-                    result[leave_type['name']] = leave_balance
-                else:
-                    _logger.info("⏩ Skipping %s (no total, no taken, no pending)", leave_type['display_name'])
-
+            # Optional planning date: balances as they will stand on that day
+            as_of = None
+            if params.get('as_of'):
+                try:
+                    as_of = datetime.strptime(params['as_of'], '%Y-%m-%d').date()
+                except (TypeError, ValueError):
+                    return {'success': False, 'error': 'as_of must be in string format: YYYY-MM-DD'}
+                if as_of.year > date.today().year + MAX_AS_OF_YEARS_AHEAD:
+                    return {'success': False, 'error': f'as_of cannot be later than {date.today().year + MAX_AS_OF_YEARS_AHEAD}-12-31'}
+
+            result = self._get_employee_balances(employee, as_of=as_of)
+            if as_of:
+                result = dict(result, as_of=as_of.isoformat())
             return result
 
         except Exception as e:
@@ -834,791 +962,59 @@ class LeaveController(http.Controller):
             return {'success': False, 'error': str(e)}
 
 
+    def _get_employee_balances(self, employee, as_of=None):
+        """Balances of `employee` from hr.leave.balance, computed at most once per HTTP request.
 
-
-    def _get_system_start_date(self):
-        """Define when your system started tracking leaves in hr_leave"""
-        return date(2025, 10, 26)  # Updated to match requirements
-
-    def _get_permanent_date(self, employee):
-        """Get employee's permanent date"""
-        # Check if permanent_date field exists, otherwise calculate from join_date
-        if hasattr(employee, 'permanent_date') and employee.permanent_date:
-            return employee.permanent_date
-        elif employee.join_date:
-            return employee.join_date + relativedelta(years=1)
-        return None
-
-    def _is_historical_data(self, year, record_create_date=None):
-        """Enhanced method to properly detect historical data"""
-        system_start_date = self._get_system_start_date()
-        system_start_year = system_start_date.year
-        year_start = date(year, 1, 1)
-        
-        _logger.info(f"Checking historical data for year {year}: system_start={system_start_date}, year_start={year_start}")
-        
-        # If year is before system start year → always historical
-        if year < system_start_year:
-            _logger.info(f"Year {year} < system start year {system_start_year} → HISTORICAL")
-            return True
-        
-        # If same year as system start
-        if year == system_start_year:
-            if record_create_date:
-                # Created before system start date → historical
-                if record_create_date < system_start_date:
-                    _logger.info(f"Record created {record_create_date} < system start {system_start_date} → HISTORICAL")
-                    return True
-            else:
-                # No create_date? Check if year start is before system start
-                if year_start < system_start_date:
-                    _logger.info(f"Year start {year_start} < system start {system_start_date}, no create date → HISTORICAL")
-                    return True
-        
-        _logger.info(f"Year {year} → REAL-TIME")
-        return False
-
-    def _get_carry_forward_from_previous_year(self, employee, current_year, leave_type_name='Annual Leave'):
-        """Carry forward the remaining balance from the previous year."""
-        previous_year = current_year - 1
-
-        if leave_type_name != 'Annual Leave':
-            return 0
-
-        system_start = self._get_system_start_date()
-        is_prev_year_historical = self._is_historical_data(previous_year)
-
-        previous_tracker = request.env['hr.leave.tracker'].sudo().search([
-            ('employee_id', '=', employee.id),
-            ('leave_type_name', '=', leave_type_name),
-            ('year', '=', previous_year)
-        ], limit=1)
-
-        if previous_tracker:
-            try:
-                created_before_start = (
-                    previous_tracker.create_date 
-                    and previous_tracker.create_date.date() <= system_start
-                )
-            except Exception:
-                created_before_start = False
-
-            if created_before_start or is_prev_year_historical:
-                # Always use stored/historical balance
-                return max(
-                    previous_tracker.current_balance or 0, 
-                    0
-                )
-
-            # For normal years, just carry forward previous balance directly
-            return max(previous_tracker.current_balance or 0, 0)
-
-        # If no tracker exists and it's not historical → no carry forward
-        return 0
-
-
-    
-    def _months_accrued(self, start_date, as_of_date, accrue_on_month_start=True):
-        if start_date > as_of_date:
-            return 0
-
-        if not accrue_on_month_start:
-            y, m = start_date.year, start_date.month
-            months = 0
-            while (y, m) <= (as_of_date.year, as_of_date.month):
-                last_day = date(y, m, monthrange(y, m)[1])
-                if last_day <= as_of_date:
-                    months += 1
-                else:
-                    break
-                if m == 12:
-                    y, m = y + 1, 1
-                else:
-                    m += 1
-            return months
-
-        # accrue_on_month_start == True:
-        months = (as_of_date.year - start_date.year) * 12 + (as_of_date.month - start_date.month)
-        if as_of_date.day > 1:
-            months += 1
-        return max(0, months)
-
-    def _update_existing_record(self, record, employee, today):
+        With `as_of` the balances are projected to that date from a single
+        prefetch of the employee's leaves and trackers.
+        Read-only: trackers are persisted by the hr.leave hooks and the recompute job, never here.
         """
-        Idempotent recalculation for trackers with total_dynamic support:
-        - Keep total_allocation unchanged (static base allocation)
-        - Calculate total_dynamic = total_allocation + accrued_new
-        - Use total_dynamic for availability calculations
-        """
-        current_year = today.year
-        record_create_date = record.create_date.date() if record.create_date else None
-        is_historical = self._is_historical_data(current_year, record_create_date)
-
-        if record.leave_type_name in ['Annual Leave', 'Casual Leave']:
-            accrual = (
-                self._calculate_annual_leave_accrual(employee, today)
-                if record.leave_type_name == 'Annual Leave'
-                else self._calculate_casual_leave_accrual(employee, today)
-            )
-
-            if is_historical:
-                system_start = self._get_system_start_date()
-                # Always use imported_taken as base for historical data
-                if hasattr(record, "imported_taken") and record.imported_taken is not None:
-                    base_taken = record.imported_taken
-                else:
-                    base_taken = 0.0
-
-                if base_taken == 0.0:
-                    imported_snapshot = False
-                    if record.create_date:
-                        try:
-                            imported_snapshot = (record.create_date.date() < system_start)
-                        except Exception:
-                            imported_snapshot = False
-
-                    if imported_snapshot:
-                        base_taken = record.taken_leaves or 0.0
-                        try:
-                            record.sudo().write({'imported_taken': base_taken})
-                        except Exception:
-                            pass
-                    else:
-                        base_domain = [
-                            ('employee_id', '=', employee.id),
-                            ('holiday_status_id.name', 'ilike', record.leave_type_name),
-                            ('state', '=', 'validate'),
-                            ('request_date_to', '<', system_start),
-                        ]
-                        base_leaves = request.env['hr.leave'].sudo().search(base_domain)
-                        base_taken = sum(base_leaves.mapped('number_of_days')) or 0.0
-
-                new_taken = self._get_taken_leaves_after_date(
-                    employee.id, record.leave_type_name, current_year, system_start
-                ) or 0.0
-
-                total_taken = base_taken + new_taken
-                pending = self._get_actual_pending_leaves(employee.id, record.leave_type_name, current_year)
-
-                total_allocation = record.total_allocation or 0.0 
-                
-                if record.leave_type_name == 'Annual Leave':
-                    total_dynamic = total_allocation + accrual.get('accrued_new', 0)
-                    available = total_dynamic - total_taken
-                    system_taken = accrual.get('system_taken', total_taken)
-                else:
-                    total_dynamic = total_allocation
-                    available = total_allocation - total_taken
-                    system_taken = total_taken
-
-                record_vals = {
-                    'taken_leaves': total_taken,
-                    'pending_requests': pending,
-                    'current_balance': available,
-                    'write_date': fields.Datetime.now(),
-                    'write_uid': request.env.user.id,
-                }
-                record.sudo().write(record_vals)
-
-                return {
-                    'total': total_allocation,
-                    'total_dynamic': total_dynamic if record.leave_type_name == 'Annual Leave' else None,
-                    'taken': total_taken,
-                    'system_taken': system_taken,
-                    'available': available,
-                    'pending': pending,
-                    'carried_forward': getattr(record, 'annual_carry', 0),
-                    'expired_carried': getattr(record, 'expired_carry', 0),
-                }
-
+        cache = getattr(request, '_leave_balances', None)
+        if cache is None:
+            cache = request._leave_balances = {}
+        key = (employee.id, as_of)
+        if key not in cache:
+            service = request.env['hr.leave.balance'].sudo()
+            if as_of:
+                cache[key] = service._get_balances_for_employees(employee, as_of)[employee.id]
             else:
-                # real-time: use live accrual + actuals
-                total_taken = self._get_actual_taken_leaves(employee.id, record.leave_type_name, current_year)
-                pending = self._get_actual_pending_leaves(employee.id, record.leave_type_name, current_year)
-                
-                total_allocation = record.total_allocation or 0.0
-                
-                if record.leave_type_name == 'Annual Leave':
-                    total_dynamic = accrual['total']
-                    available = total_dynamic - total_taken
-                    system_taken = accrual.get('system_taken', total_taken)
-                else:
-                    total_dynamic = total_allocation
-                    available = total_allocation - total_taken
-                    system_taken = total_taken
-
-                record.sudo().write({
-                    'taken_leaves': total_taken,
-                    'pending_requests': pending,
-                    'current_balance': available,
-                    'annual_carry': accrual.get('carried_forward', 0),
-                    'expired_carry': accrual.get('expired_carried', 0),
-                    'write_date': fields.Datetime.now(),
-                    'write_uid': request.env.user.id,
-                })
-                
-                return {
-                    'total': total_allocation,
-                    'total_dynamic': total_dynamic if record.leave_type_name == 'Annual Leave' else None,
-                    'taken': total_taken,
-                    'system_taken': system_taken,
-                    'available': available,
-                    'pending': pending,
-                    'carried_forward': accrual.get('carried_forward', 0),
-                    'expired_carried': accrual.get('expired_carried', 0),
-                }
-
-        else:
-            # For all other leave types, also recalc including historical + actual
-            system_start = self._get_system_start_date()
-            record_create_date = record.create_date.date() if record.create_date else None
-            is_historical = self._is_historical_data(current_year, record_create_date)
-
-            if is_historical:
-                # Combine historical + actual
-                if hasattr(record, "imported_taken") and record.imported_taken is not None:
-                    base_taken = record.imported_taken
-                else:
-                    base_domain = [
-                        ('employee_id', '=', employee.id),
-                        ('holiday_status_id.name', 'ilike', record.leave_type_name),
-                        ('state', '=', 'validate'),
-                        ('request_date_to', '<', system_start),
-                    ]
-                    base_leaves = request.env['hr.leave'].sudo().search(base_domain)
-                    base_taken = sum(base_leaves.mapped('number_of_days')) or 0.0
-
-                new_taken = self._get_taken_leaves_after_date(
-                    employee.id, record.leave_type_name, current_year, system_start
-                ) or 0.0
-
-                total_taken = base_taken + new_taken
-            else:
-                total_taken = self._get_actual_taken_leaves(employee.id, record.leave_type_name, current_year)
-
-            pending = self._get_actual_pending_leaves(employee.id, record.leave_type_name, current_year)
-            total_allocation = record.total_allocation or 0.0
-            available = total_allocation - total_taken
-
-            record.sudo().write({
-                'taken_leaves': total_taken,
-                'pending_requests': pending,
-                'current_balance': available,
-                'write_date': fields.Datetime.now(),
-                'write_uid': request.env.user.id,
-            })
-
-            return {
-                'total': total_allocation,
-                'taken': total_taken,
-                'system_taken': total_taken,
-                'available': available,
-                'pending': pending,
-                'carried_forward': getattr(record, 'annual_carry', 0),
-                'expired_carried': getattr(record, 'expired_carry', 0),
-            }
-
-
-
-    def _get_taken_leaves_after_date(self, employee_id, leave_type, year, after_date):
-        """Get taken leaves after a specific date in the year"""
-        start_of_year = date(year, 1, 1)
-        end_of_year = date(year, 12, 31)
-        
-        domain = [
-            ('employee_id', '=', employee_id),
-            ('holiday_status_id.name', 'ilike', leave_type),
-            ('state', '=', 'validate'),
-            ('request_date_from', '>=', max(start_of_year, after_date)),
-            ('request_date_to', '<=', end_of_year)
-        ]
+                cache[key] = service._get_employee_balances(employee)
+        return cache[key]
 
-        leaves = request.env['hr.leave'].sudo().search(domain)
-        taken_after_date = sum(leaves.mapped('number_of_days'))
-        
-        _logger.info(f"Taken leaves after {after_date} for {leave_type}: {taken_after_date}")
-        return taken_after_date
-
-    def _create_tracker_record(self, employee, leave_type, balance, year):
-        """Create tracker record with proper handling for historical vs current data"""
-
-        # Check if this should be treated as historical data
-        system_start_date = self._get_system_start_date()
-        year_start = date(year, 1, 1)
-        is_historical_year = year_start < system_start_date
-
-        leave_type_obj = request.env['hr.leave.type'].sudo().search(
-            [('name', '=', leave_type['display_name'])], limit=1
-        )
-        if not leave_type_obj:
-            leave_type_obj = request.env['hr.leave.type'].sudo().create({
-                'name': leave_type['display_name']
-            })
-
-        # Search again to avoid duplicates
-        existing_tracker = request.env['hr.leave.tracker'].sudo().search([
-            ('employee_id', '=', employee.id),
-            ('leave_type_name', '=', leave_type['display_name']),
-            ('year', '=', year)
-        ], limit=1)
-
-        if existing_tracker:
-            # Return existing tracker data with total_dynamic for Annual Leave
-            result = {
-                'total': existing_tracker.total_allocation or 0,
-                'taken': existing_tracker.taken_leaves or 0,
-                'available': existing_tracker.current_balance or 0,
-                'pending': existing_tracker.pending_requests or 0,
-                'carried_forward': getattr(existing_tracker, 'annual_carry', 0),
-                'expired_carried': getattr(existing_tracker, 'expired_carry', 0),
-            }
-            
-            # Add total_dynamic for Annual Leave
-            if leave_type['display_name'] == 'Annual Leave' and balance.get('total_dynamic'):
-                result['total_dynamic'] = balance['total_dynamic']
-                
-            return result
-
-        # Create the record
-        tracker_data = {
-            'employee_id': employee.id,
-            'leave_type_id': leave_type_obj.id,
-            'leave_type_name': leave_type['display_name'],
-            'year': year,
-            'total_allocation': balance['total'],  # This is the static base allocation
-            'taken_leaves': balance['taken'],
-            'pending_requests': balance['pending'],
-            'current_balance': balance['available'],
-            'employee_name': employee.name,
-            'employee_number': employee.employee_number or '',
-            'name': f"{leave_type['display_name']} {year}",
-            'department_id': employee.department_id.id if employee.department_id else False,
-            'annual_carry': balance.get('carried_forward', 0),
-            'expired_carry': balance.get('expired_carried', 0),
-            'create_uid': request.env.user.id,
-            'write_uid': request.env.user.id
-        }
-
-        # Add historical flag if your model supports it
-        if hasattr(request.env['hr.leave.tracker'], 'is_historical'):
-            tracker_data['is_historical'] = is_historical_year
-
-        _logger.info(
-            f"Creating new tracker record for {employee.name} - {leave_type['display_name']} "
-            f"- Year: {year} - Historical: {is_historical_year}"
-        )
-
-        request.env['hr.leave.tracker'].sudo().create(tracker_data)
-
-        # Return the balance dict with total_dynamic for Annual Leave
-        result = {
-            'total': balance['total'],  # Static allocation
-            'taken': balance['taken'],
-            'available': balance['available'],
-            'pending': balance['pending'],
-            'carried_forward': balance.get('carried_forward', 0),
-            'expired_carried': balance.get('expired_carried', 0),
-        }
-        
-        # Add total_dynamic for Annual Leave
-        if leave_type['display_name'] == 'Annual Leave' and balance.get('total_dynamic'):
-            result['total_dynamic'] = balance['total_dynamic']
-            
-        return result
-
-    def _calculate_default_leave_balance(self, leave_type, employee, today):
-        """Calculate leave balance using default logic when no tracker record exists"""
-        current_year = today.year
-        gender = (employee.gender or '').lower()
-        marital_status = (employee.marital or '').lower()
-        join_date = employee.join_date
-        service_months = 0
-        if join_date:
-            delta = relativedelta(today, join_date)
-            service_months = delta.years * 12 + delta.months
-
-        if leave_type == 'Casual Leave':
-            return self._calculate_casual_leave_accrual(employee, today)
-
-        elif leave_type == 'Annual Leave' and service_months >= 12:
-            return self._calculate_annual_leave_accrual(employee, today)
-
-        elif leave_type == 'Medical Leave' and service_months >= 6:
-            return self._calculate_fixed_leave(30, employee.id, leave_type, current_year)
-
-        elif leave_type == 'Funeral Leave':
-            return self._calculate_lifetime_leave(7, employee.id, leave_type)
-
-        elif leave_type == 'Marriage Leave' and marital_status == 'single' and service_months >= 12:
-            return self._calculate_lifetime_leave(5, employee.id, leave_type)
-
-        elif leave_type == 'Unpaid Leave':
-            return self._calculate_fixed_leave(30, employee.id, leave_type, current_year)
-
-        elif leave_type == 'Maternity Leave' and marital_status == 'married' and gender == 'female':
-            return self._calculate_lifetime_leave(98, employee.id, leave_type)
-
-        elif leave_type == 'Paternity Leave' and marital_status == 'married' and gender == 'male':
-            return self._calculate_lifetime_leave(15, employee.id, leave_type)
-
-        else:
-            # If not eligible, return empty balance
-            return {'total': 0, 'taken': 0, 'available': 0, 'pending': 0,
-                    'carried_forward': 0, 'expired_carried': 0}
-
-    
-    def _calculate_casual_leave_accrual(self, employee, today):
-        current_year = today.year
-        permanent_date = self._get_permanent_date(employee)
-        _logger.info('Permanent date %s', permanent_date)
-
-        if not permanent_date or today < permanent_date:
-            return {'total': 0, 'taken': 0, 'available': 0, 'pending': 0, 'carried_forward': 0, 'expired_carried': 0}
-
-        if permanent_date.year < current_year:
-            total_casual = 12 * 0.5  # Full year allocation
-        elif permanent_date.year == current_year:
-            if today >= permanent_date:
-                # Accrue from permanent month (inclusive) through December (inclusive)
-                # Example: permanent_date = 2025-08-26 -> months = 5 (Aug, Sep, Oct, Nov, Dec)
-                months = 12 - permanent_date.month + 1
-                total_casual = months * 0.5
-            else:
-                total_casual = 0  # Not eligible until permanent date
-        else:
-            total_casual = 0
-
-        taken = self._get_actual_taken_leaves(employee.id, 'Casual Leave', current_year)
-        pending = self._get_actual_pending_leaves(employee.id, 'Casual Leave', current_year)
-        available = total_casual - taken
-
-        return {
-            'total': total_casual,
-            'taken': taken,
-            'available': available,
-            'pending': pending,
-            'carried_forward': 0,
-            'expired_carried': 0
-        }
-    
-    def _count_accrued_months(self, start_date, today):
-        """Count full months from start_date up to today."""
-        months = (today.year - start_date.year) * 12 + (today.month - start_date.month)
-        last_day_of_month = (date(today.year, today.month, 1) + relativedelta(months=1)) - timedelta(days=1)
-        if today == last_day_of_month:
-            months += 1
-        return max(0, months)
-
-    def _calculate_annual_leave_accrual(self, employee, today):
-        """Calculate annual leave accrual for an employee and store total_dynamic in tracker"""
-        current_year = today.year
-        join_date = getattr(employee, 'join_date', None)
-
-        # --- Initialize all return variables to avoid UnboundLocalError ---
-        total = 0
-        total_dynamic = 0
-        accrued_new = 0
-        final_taken = 0
-        available = 0
-        pending = 0
-        resp_carried = 0
-        resp_expired = 0
-
-        if not join_date:
-            return {
-                'total': total,
-                'total_dynamic': total_dynamic,
-                'accrued_new': accrued_new,
-                'taken': final_taken,
-                'system_taken': final_taken,
-                'available': available,
-                'pending': pending,
-                'carried_forward': resp_carried,
-                'expired_carried': resp_expired,
-            }
-
-        service_date = join_date + relativedelta(years=1)
-        if today < service_date:
-            return {
-                'total': total,
-                'total_dynamic': total_dynamic,
-                'accrued_new': accrued_new,
-                'taken': final_taken,
-                'system_taken': final_taken,
-                'available': available,
-                'pending': pending,
-                'carried_forward': resp_carried,
-                'expired_carried': resp_expired,
-            }
-
-        system_start_date = self._get_system_start_date()
-        cutoff = date(current_year, 6, 30)
-
-        # ---------------- Tracker branch ----------------
-        tracker_domain = [
-            ('employee_id', '=', employee.id),
-            ('leave_type_id.name', 'ilike', 'Annual Leave'),
-            ('year', '=', str(system_start_date.year)),
-        ]
-        if current_year < system_start_date.year:
-            tracker_domain.append(
-                ('create_date', '<=', datetime.combine(system_start_date, datetime.min.time()))
-            )
-
-        tracker = request.env['hr.leave.tracker'].sudo().search(tracker_domain, limit=1)
-
-        if tracker and today.year == system_start_date.year:
-            # Use tracker for accrual
-            accrue_start = max(tracker.create_date.date(), service_date)
-            accrued_new = self._count_accrued_months(accrue_start, today)
-            static_allocation = tracker.total_allocation or 0
-            total_dynamic = static_allocation + accrued_new
-            tracker.sudo().write({'total_dynamic': total_dynamic})
-
-            # Validated leaves
-            validated_leaves = request.env['hr.leave'].sudo().search([
-                ('employee_id', '=', employee.id),
-                ('holiday_status_id.name', 'ilike', 'Annual Leave'),
-                ('state', '=', 'validate'),
-                ('request_date_from', '>=', accrue_start),
-                ('request_date_to', '<=', date(current_year, 12, 31)),
-            ])
-            validated_taken = sum(validated_leaves.mapped('number_of_days'))
-            import_taken = getattr(tracker, 'imported_taken', 0)
-
-            if not getattr(tracker, 'import_applied', False):
-                final_taken = (tracker.taken_leaves or 0) + validated_taken + (import_taken or 0)
-                tracker.sudo().write({'import_applied': True})
-            else:
-                final_taken = (tracker.taken_leaves or 0) + validated_taken
+    @http.route('/api/leave-balance/batch', type='json', auth='user', methods=['POST'], csrf=False)
+    def get_leave_balance_batch(self, **kwargs):
+        """Balances of several employees, by employee numbers or by department"""
+        try:
+            params = self._get_json_params(kwargs)
+            if not request.env.user.has_group('hr_holidays.group_hr_holidays_user'):
+                return {'success': False, 'error': 'Access denied'}
 
-            pending = self._get_actual_pending_leaves(employee.id, 'Annual Leave', current_year)
-            available = total_dynamic - final_taken
+            employee_numbers = params.get('employee_numbers') or []
+            department_id = params.get('department_id')
+            if not employee_numbers and not department_id:
+                return {'success': False, 'error': 'Missing employee_numbers or department_id'}
 
-            # Tracker branch return
-            return {
-                'total': static_allocation,
-                'total_dynamic': total_dynamic,
-                'accrued_new': accrued_new,
-                'taken': validated_taken,
-                # 'system_taken': final_taken,
-                'available': available,
-                'pending': pending,
-                'carried_forward': 0,
-                'expired_carried': 0,
-            }
+            domain = [('active', '=', True)]
+            if employee_numbers:
+                domain.append(('employee_number', 'in', [str(number) for number in employee_numbers]))
+            if department_id:
+                domain.append(('department_id', 'child_of', int(department_id)))
 
-        # ---------------- System calculation branch (no tracker) ----------------
-        _logger.debug("No tracker found, running system calculation for employee %s", employee.id)
-
-        carry_from_last_year = self._get_carry_forward_from_previous_year(employee, current_year, 'Annual Leave')
-        accrual_start = service_date if today.year == service_date.year else date(today.year, 1, 1)
-        accrued_new = self._count_accrued_months(accrual_start, today)
-
-        validated_leaves = request.env['hr.leave'].sudo().search([
-            ('employee_id', '=', employee.id),
-            ('holiday_status_id.name', 'ilike', 'Annual Leave'),
-            ('state', '=', 'validate'),
-            ('request_date_from', '>=', accrual_start),
-            ('request_date_to', '<=', date(current_year, 12, 31)),
-        ])
-        total_taken = sum(validated_leaves.mapped('number_of_days'))
-        pending = self._get_actual_pending_leaves(employee.id, 'Annual Leave', current_year)
-
-        if today <= cutoff:
-            # Before cutoff, carry is still active
-            total = carry_from_last_year + accrued_new
-            total_dynamic = total
-            resp_carried = carry_from_last_year
-            resp_expired = 0
-            final_taken = total_taken
-        else:
-            # After cutoff, deduct carry first
-            taken_from_carry = min(carry_from_last_year, total_taken)
-            taken_from_new = total_taken - taken_from_carry
-
-            resp_carried = 0
-            resp_expired = max(carry_from_last_year - total_taken, 0)
-            final_taken = taken_from_new
-
-            _logger.info("New debug for final taken %s", final_taken)
-
-            total = accrued_new + resp_carried
-            total_dynamic = total
-            
+            employees = request.env['hr.employee'].sudo().search(domain, limit=MAX_BATCH_EMPLOYEES + 1)
+            if len(employees) > MAX_BATCH_EMPLOYEES:
+                return {'success': False, 'error': f'Too many employees, at most {MAX_BATCH_EMPLOYEES} per call'}
 
-        available = total_dynamic - final_taken
-        _logger.debug(
-            "System calculation: total=%s, total_dynamic=%s, accrued_new=%s, carry_from_last_year=%s, final_taken=%s, available=%s",
-            total, total_dynamic, accrued_new, carry_from_last_year, final_taken, available
-        )
+            balances = request.env['hr.leave.balance'].sudo()._get_balances_for_employees(employees)
 
-        # Persist system calculation in tracker
-        leave_type = request.env['hr.leave.type'].sudo().search([('name', 'ilike', 'Annual Leave')], limit=1)
-        if leave_type:
-            tracker_vals = {
+            result = [{
                 'employee_id': employee.id,
-                'leave_type_id': leave_type.id,
-                'year': str(current_year),
-                'total_allocation': total,
-                'total_dynamic': total_dynamic,
-                'taken_leaves': final_taken,
-                'annual_carry': resp_carried,
-                'expired_carry': resp_expired
-            }
-            tracker_rec = request.env['hr.leave.tracker'].sudo().search([
-                ('employee_id', '=', employee.id),
-                ('leave_type_id', '=', leave_type.id),
-                ('year', '=', str(current_year))
-            ], limit=1)
-            if tracker_rec:
-                tracker_rec.sudo().write(tracker_vals)
-            else:
-                request.env['hr.leave.tracker'].sudo().create(tracker_vals)
+                'employee_number': employee.employee_number or '',
+                'name': employee.name,
+                'balances': balances[employee.id],
+            } for employee in employees]
 
-        return {
-            'total': total,
-            'total_dynamic': total_dynamic,
-            'accrued_new': accrued_new,
-            'taken': total_taken,
-            'system_taken': final_taken,
-            'available': available,
-            'pending': pending,
-            'carried_forward': resp_carried,
-            'expired_carried': resp_expired,
-        }
-
-
-
-    def _calculate_monthly_accrual(self, start_date, end_date, accrual_per_month=1.0):
-        """
-        Count full months from start_date up to last completed month before end_date.
-        Include the month of start_date if it is completed.
-        """
-        if start_date > end_date:
-            return 0
-
-        # Calculate months from start_date to end_date
-        months = (end_date.year - start_date.year) * 12 + (end_date.month - start_date.month)
-        
-        # Add partial month accrual based on day completion
-        if end_date.day >= start_date.day:
-            months += 1
-        
-        return max(months * accrual_per_month, 0)
-
-    def _calculate_previous_year_allocation(self, employee, year):
-        """Calculate what the allocation should have been for a previous year"""
-        permanent_date = self._get_permanent_date(employee)
-        if not permanent_date:
-            return 0
-        
-        if year < permanent_date.year:
-            return 0
-        elif year == permanent_date.year:
-            # Pro-rated allocation based on permanent month
-            return 12 - permanent_date.month + 1
-        else:
-            # Full year allocation (12 months)
-            return 12
-
-    def _calculate_fixed_leave(self, total_allocation, employee_id, leave_type, year):
-        """Calculate fixed annual allocation leaves (medical, unpaid)"""
-        start_of_year = date(year, 1, 1)
-        end_of_year = date(year, 12, 31)
-        
-        leaves = request.env['hr.leave'].sudo().search([
-            ('employee_id', '=', employee_id),
-            ('holiday_status_id.name', 'ilike', leave_type),
-            ('request_date_from', '>=', start_of_year),
-            ('request_date_to', '<=', end_of_year),
-            ('state', '=', 'validate'),
-        ])
-        taken = sum(leaves.mapped('number_of_days'))
-
-        pending_leaves = request.env['hr.leave'].sudo().search([
-            ('employee_id', '=', employee_id),
-            ('holiday_status_id.name', 'ilike', leave_type),
-            ('request_date_from', '>=', start_of_year),
-            ('request_date_to', '<=', end_of_year),
-            ('state', 'in', ['confirm', 'validate1']),
-        ])
-        pending = sum(pending_leaves.mapped('number_of_days'))
-        _logger.debug("Fixed leave calculation for %s: total=%s, taken=%s, pending=%s ,available=%s", leave_type, total_allocation, taken, pending, max(total_allocation - taken, 0))
-
-        return {
-            'total': total_allocation,
-            'taken': taken,
-            'available': total_allocation - taken,
-            'pending': pending,
-            'carried_forward': 0,
-            'expired_carried': 0
-        }
-
-    def _calculate_lifetime_leave(self, total_allocation, employee_id, leave_type):
-        """Calculate lifetime allocation leaves (funeral, marriage, maternity, paternity)"""
-        leaves = request.env['hr.leave'].sudo().search([
-            ('employee_id', '=', employee_id),
-            ('holiday_status_id.name', 'ilike', leave_type),
-            ('state', '=', 'validate'),
-        ])
-        taken = sum(leaves.mapped('number_of_days'))
-
-        pending_leaves = request.env['hr.leave'].sudo().search([
-            ('employee_id', '=', employee_id),
-            ('holiday_status_id.name', 'ilike', leave_type),
-            ('state', 'in', ['confirm', 'validate1']),
-        ])
-        pending = sum(pending_leaves.mapped('number_of_days'))
-        _logger.debug("Lifetime leave taken: %s, pending: %s", taken, pending)
-
-        return {
-            'total': total_allocation,
-            'taken': taken,
-            'available': total_allocation - taken,
-            'pending': pending,
-            'carried_forward': 0,
-            'expired_carried': 0
-        }
-
-    def _get_actual_taken_leaves(self, employee_id, leave_type, year):
-        """Get actual taken leaves from hr_leave table"""
-        start_of_year = date(year, 1, 1)
-        end_of_year = date(year, 12, 31)
+            return {'success': True, 'result': result}
 
-        domain = [
-            ('employee_id', '=', employee_id),
-            ('holiday_status_id.name', 'ilike', leave_type),
-            ('state', '=', 'validate')
-        ]
-        
-        # For lifetime leaves, don't filter by year
-        if leave_type not in ['Funeral Leave', 'Marriage Leave', 'Maternity Leave', 'Paternity Leave']:
-            domain += [('request_date_from', '>=', start_of_year), ('request_date_to', '<=', end_of_year)]
-
-        leaves = request.env['hr.leave'].sudo().search(domain)
-        taken = sum(leaves.mapped('number_of_days'))
-        
-        _logger.info(f"Actual taken leaves for {leave_type} in {year}: {taken}")
-        return taken
-
-    def _get_actual_pending_leaves(self, employee_id, leave_type, year):
-        """Get actual pending leaves from hr_leave table"""
-        start_of_year = date(year, 1, 1)
-        end_of_year = date(year, 12, 31)
-
-        domain = [
-            ('employee_id', '=', employee_id),
-            ('holiday_status_id.name', 'ilike', leave_type),
-            ('state', 'in', ['confirm', 'validate1'])
-        ]
-        
-        # For lifetime leaves, don't filter by year
-        if leave_type not in ['Funeral Leave', 'Marriage Leave', 'Maternity Leave', 'Paternity Leave']:
-            domain += [('request_date_from', '>=', start_of_year), ('request_date_to', '<=', end_of_year)]
-
-        leaves = request.env['hr.leave'].sudo().search(domain)
-        pending = sum(leaves.mapped('number_of_days'))
-        
-        _logger.info(f"Actual pending leaves for {leave_type} in {year}: {pending}")
-        return pending
\ No newline at end of file
+        except Exception as e:
+            _logger.exception("Error in get_leave_balance_batch")
+            return {'success': False, 'error': str(e)}
@@ -1,14 +1,10 @@
 from odoo import http
 from odoo.http import request
 import logging
-import uuid
-import json
-import time
 
-_logger = logging.getLogger(__name__)
+from odoo.addons.AGB_HR.models.employee_login import PasswordHashingBusy
 
-MAX_ATTEMPTS = 5
-BLOCK_TIME = 300  # 5 minutes
+_logger = logging.getLogger(__name__)
 
 
 class EmployeePortal(http.Controller):
@@ -17,85 +13,108 @@ class EmployeePortal(http.Controller):
     def employee_register(self, **kwargs):
         _logger.info("Rendering employee register: %s", kwargs)
 
-        # Track login attempts
-        attempts = request.session.get('login_attempts', 0)
-        last_attempt = request.session.get('last_attempt', 0)
-        now = time.time()
-
-        if attempts >= MAX_ATTEMPTS and (now - last_attempt) < BLOCK_TIME:
-            return request.render('AGB_HR.register_template', {
-                'error': 'Too many failed attempts. Please try again later.',
-                'employee_number': kwargs.get('employee_number', ''),
-                'forgot': False,
-            })
-
         # Already logged in → redirect
         if request.session.get('employee_number'):
             return request.redirect('/attendance/dashboard')
 
         if request.httprequest.method == 'POST':
-            emp_id = kwargs.get('employee_number')
-            password = kwargs.get('password')
-            new_password = kwargs.get('new_password')
-            forgot = kwargs.get('forgot')
-
-            employee = request.env['hr.employee'].sudo().search(
-                [('employee_number', '=', emp_id)], limit=1)
+            # Shared per employee number and client IP, checked before any lookup or hashing
+            retry_after = request.env['employee.login.throttle']._consume_login_attempt(
+                kwargs.get('employee_number'), request.httprequest.remote_addr,
+            )
+            if retry_after:
+                return request.render('AGB_HR.register_template', {
+                    'error': 'Too many login attempts. Please try again later.',
+                    'employee_number': kwargs.get('employee_number', ''),
+                    'forgot': False,
+                }, status=429, headers=[('Retry-After', str(retry_after))])
+
+            try:
+                return self._employee_login(kwargs)
+            except PasswordHashingBusy as e:
+                # Every hashing slot is taken: shed the login storm rather than queue it
+                request.env.cr.rollback()
+                _logger.warning("Password hashing slots all taken, login of %s refused", kwargs.get('employee_number'))
+                return request.render('AGB_HR.register_template', {
+                    'error': 'Too many people are logging in right now. Please try again in a few seconds.',
+                    'employee_number': kwargs.get('employee_number', ''),
+                    'forgot': False,
+                }, status=503, headers=[('Retry-After', str(e.retry_after))])
 
-            if not employee:
+        # The reset form is only shown from the link mailed by _request_password_reset
+        reset_token = kwargs.get('reset_token', '')
+        return request.render('AGB_HR.register_template', {
+            'employee_number': kwargs.get('employee_number', ''),
+            'forgot': bool(reset_token) and kwargs.get('forgot', '').lower() in ['1', 'true', 'yes'],
+            'reset_token': reset_token,
+        })
+
+    def _employee_login(self, kwargs):
+        """POST of the register form: log in, register on first login, or reset the password with a mailed token."""
+        emp_id = kwargs.get('employee_number')
+        Login = request.env['employee.login'].sudo()
+
+        # Forgot password flow: mail a reset link, then set the password with its token
+        if kwargs.get('forgot'):
+            reset_token = kwargs.get('reset_token')
+            if not reset_token:
+                Login._request_password_reset(emp_id)
+                # Same answer whether or not a link was sent, not to reveal who has a login
                 return request.render('AGB_HR.register_template', {
-                    'error': 'Employee ID not found.',
+                    'success': 'If this Employee ID has a work e-mail, a password reset link was sent to it. '
+                               'Otherwise please contact IT support.',
                     'employee_number': emp_id,
                     'forgot': False,
                 })
-
-            login_rec = request.env['employee.login'].sudo().search(
-                [('employee_number', '=', employee.id)], limit=1)
-
-            if not login_rec:
-                login_rec = request.env['employee.login'].sudo().create({
-                    'employee_number': employee.id,
-                    'password': password,
+            new_password = kwargs.get('new_password')
+            if not new_password:
+                return request.render('AGB_HR.register_template', {
+                    'error': 'Please enter a new password.',
+                    'employee_number': emp_id,
+                    'forgot': True,
+                    'reset_token': reset_token,
                 })
-
-            # Forgot password flow
-            if forgot:
-                if not new_password:
-                    return request.render('AGB_HR.register_template', {
-                        'error': 'Please enter a new password.',
-                        'employee_number': emp_id,
-                        'forgot': True
-                    })
-                login_rec.sudo().write({'password': new_password})
+            if not Login._reset_password(emp_id, reset_token, new_password):
                 return request.render('AGB_HR.register_template', {
-                    'success': 'Password updated successfully. Please log in again.',
+                    'error': 'This password reset link is invalid or has expired.',
                     'employee_number': emp_id,
-                    'forgot': False
+                    'forgot': False,
                 })
+            return request.render('AGB_HR.register_template', {
+                'success': 'Password updated successfully. Please log in again.',
+                'employee_number': emp_id,
+                'forgot': False
+            })
 
-            if login_rec.check_password(password):
-                request.session['employee_number'] = employee.id
-                request.session['login_attempts'] = 0
-                token = str(uuid.uuid4())
-                login_rec.sudo().write({'login_token': token})
-
-                _logger.info("Employee %s (%s) logged in successfully.", employee.name, emp_id)
-
-                request.session['login_message'] = f"Welcome {employee.name}! You have logged in successfully."
-
-                return request.redirect('/attendance/dashboard')
-
-
-            # Wrong password
-            request.session['login_attempts'] = attempts + 1
-            request.session['last_attempt'] = now
+        status, employee_id, employee_name = Login._authenticate(emp_id, kwargs.get('password'))
+        if status == 'unknown_employee':
+            return request.render('AGB_HR.register_template', {
+                'error': 'Employee ID not found.',
+                'employee_number': emp_id,
+                'forgot': False,
+            })
+        if status == 'wrong_password':
             return request.render('AGB_HR.register_template', {
                 'error': 'Wrong password.',
                 'employee_number': emp_id,
                 'forgot': False
             })
 
-        return request.render('AGB_HR.register_template', {
-            'employee_number': kwargs.get('employee_number', ''),
-            'forgot': kwargs.get('forgot', '').lower() in ['1', 'true', 'yes'],
-        })
\ No newline at end of file
+        request.session['employee_number'] = employee_id
+        _logger.info("Employee %s (%s) logged in successfully.", employee_name, emp_id)
+        if status == 'registered':
+            # First login: let them complete their profile
+            return request.redirect('/employee/profile')
+        request.session['login_message'] = f"Welcome {employee_name}! You have logged in successfully."
+        return request.redirect('/attendance/dashboard')
+
+    @http.route('/api/metrics/login-throttle', type='json', auth='user', methods=['POST'], csrf=False)
+    def get_login_throttle_metrics(self, **kwargs):
+        """Login throttling counters, for administrators."""
+        try:
+            if not request.env.user.has_group('base.group_system'):
+                return {'success': False, 'error': 'Access denied'}
+            return {'success': True, 'result': request.env['employee.login.throttle'].sudo()._get_metrics()}
+        except Exception as e:
+            _logger.exception("Error reading login throttle metrics: %s", str(e))
+            return {'success': False, 'error': str(e)}
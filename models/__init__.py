@@ -1,2 +1,10 @@
 from . import employee_login
-from . import hr_leave
\ No newline at end of file
+from . import login_throttle
+from . import hr_employee
+from . import hr_leave
+from . import leave_balance
+from . import leave_summary
+from . import leave_change
+from . import leave_notification
+from . import leave_submission
+from . import resource_calendar
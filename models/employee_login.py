@@ -1,17 +1,63 @@
 from odoo import models, fields, api
 from passlib.context import CryptContext
+from passlib.hash import pbkdf2_sha512
 from datetime import datetime, timedelta
+from markupsafe import escape
+from werkzeug.urls import url_encode
+import hmac
+import logging
+import os
+import time
 import uuid
 
+_logger = logging.getLogger(__name__)
+
 pwd_context = CryptContext(schemes=["pbkdf2_sha512"], deprecated="auto")
 
+# ir.config_parameter: pbkdf2_sha512 rounds of new hashes, set by _tune_hash_rounds().
+# Stored hashes with other rounds are re-hashed at their owner's next login.
+# Never below passlib's own default, however slow the host.
+HASH_ROUNDS_PARAM = 'AGB_HR.password_hash_rounds'
+MIN_HASH_ROUNDS = pbkdf2_sha512.default_rounds
+
+# Hashes computed at once by all workers together, each holding one of the
+# pg_try_advisory_lock(HASH_SLOT_LOCK, slot) slots while it hashes; logins finding
+# every slot taken are refused at once with a 503 and Retry-After.
+HASH_SLOTS_PARAM = 'AGB_HR.password_hash_slots'
+DEFAULT_HASH_SLOTS = max(1, (os.cpu_count() or 2) // 2)
+HASH_SLOT_LOCK = 57402
+HASH_RETRY_AFTER = 5  # seconds
+
+_hash_contexts = {}
+
+
+class PasswordHashingBusy(Exception):
+    """Every hashing slot is taken: answer the login with a 503 and `retry_after`."""
+    retry_after = HASH_RETRY_AFTER
+
+
+def get_hash_context(rounds=None):
+    """CryptContext hashing with `rounds` and flagging other rounds for update, pwd_context when None."""
+    if not rounds:
+        return pwd_context
+    context = _hash_contexts.get(rounds)
+    if context is None:
+        context = _hash_contexts[rounds] = CryptContext(
+            schemes=["pbkdf2_sha512"], deprecated="auto",
+            pbkdf2_sha512__default_rounds=rounds,
+            pbkdf2_sha512__min_rounds=rounds,
+            pbkdf2_sha512__max_rounds=rounds,
+        )
+    return context
+
+
 class EmployeeLogin(models.Model):
     _name = 'employee.login'
     _description = 'Employee Login'
     
-    employee_number = fields.Many2one('hr.employee', required=True)
+    employee_number = fields.Many2one('hr.employee', required=True, index=True)
     password = fields.Char(required=True)
-    login_token = fields.Char(string='Login Token', readonly=True)
+    login_token = fields.Char(string='Login Token', readonly=True, index=True)
 
     # New fields for reset flow
     reset_token = fields.Char(string='Password Reset Token', copy=False, index=True)
@@ -21,29 +67,182 @@ class EmployeeLogin(models.Model):
     # Password hashing
     # -----------------------------
     def _hash_password(self, raw_password):
-        return pwd_context.hash(raw_password)
+        return self._run_hashing(self._get_hash_context().hash, raw_password)
+
+    def _run_hashing(self, func, *args):
+        """Run the pbkdf2 `func(*args)` holding one of the hashing slots shared by every worker.
+
+        The slot is a session advisory lock taken for the hash only, which
+        caps the CPU a login storm takes across all workers. Raises
+        PasswordHashingBusy, without waiting, when every slot is taken.
+        """
+        slots = self.env['ir.config_parameter'].sudo().get_param(HASH_SLOTS_PARAM)
+        slots = int(slots) if slots and slots.isdigit() else DEFAULT_HASH_SLOTS
+        self.env.cr.execute("""
+            SELECT slot FROM generate_series(0, %s - 1) AS slot
+             WHERE pg_try_advisory_lock(%s, slot)
+             LIMIT 1
+        """, (slots, HASH_SLOT_LOCK))
+        row = self.env.cr.fetchone()
+        if not row:
+            raise PasswordHashingBusy()
+        try:
+            return func(*args)
+        finally:
+            self.env.cr.execute("SELECT pg_advisory_unlock(%s, %s)", (HASH_SLOT_LOCK, row[0]))
+
+    def _get_hash_context(self):
+        rounds = self.env['ir.config_parameter'].sudo().get_param(HASH_ROUNDS_PARAM)
+        return get_hash_context(max(int(rounds), MIN_HASH_ROUNDS) if rounds and rounds.isdigit() else None)
 
     @api.model
     def create(self, vals):
         if vals.get('password'):
-            vals['password'] = pwd_context.hash(vals['password'])
+            vals['password'] = self._hash_password(vals['password'])
         if not vals.get('login_token'):
             vals['login_token'] = str(uuid.uuid4())
         return super(EmployeeLogin, self).create(vals)
 
     def write(self, vals):
         if vals.get('password'):
-            vals['password'] = pwd_context.hash(vals['password'])
+            vals['password'] = self._hash_password(vals['password'])
         return super(EmployeeLogin, self).write(vals)
 
-    def check_password(self, raw_password):
-        """Compare the raw password with the stored hash."""
-        if not self.password:
-            return False
+    def _verify(self, raw_password, password_hash):
+        """(valid, new hash or None) of a password against a stored hash, in a hashing slot."""
         try:
-            return pwd_context.verify(raw_password, self.password)
+            return self._run_hashing(self._get_hash_context().verify_and_update, raw_password, password_hash)
+        except PasswordHashingBusy:
+            raise
         except Exception:
+            return False, None
+
+    @api.model
+    def _tune_hash_rounds(self, target_ms=100, sample_rounds=20000):
+        """Benchmark pbkdf2_sha512 here and set the rounds taking about `target_ms` per hash.
+
+        Run it from a shell on the production host; stored passwords move to
+        the new rounds as their owners log in.
+        """
+        context = get_hash_context(sample_rounds)
+        seconds = min(self._time_hash(context) for _attempt in range(3))
+        rounds = max(MIN_HASH_ROUNDS, int(sample_rounds * target_ms / 1000 / seconds) // 1000 * 1000)
+        self.env['ir.config_parameter'].sudo().set_param(HASH_ROUNDS_PARAM, rounds)
+        _logger.info("Password hash rounds set to %s (%.1f ms per %s rounds)", rounds, seconds * 1000, sample_rounds)
+        return rounds
+
+    def _time_hash(self, context):
+        start = time.perf_counter()
+        context.hash('benchmark')
+        return time.perf_counter() - start
+
+    # -----------------------------
+    # Login service, shared by /employee/register and the APK token
+    # -----------------------------
+    @api.model
+    def _find_login(self, employee_number):
+        """(employee id, name, login id, password hash) of an active employee number, or None.
+
+        One indexed query; the login id and hash are None before the
+        employee's first login.
+        """
+        self.env['hr.employee'].flush(['employee_number', 'name', 'active'])
+        self.flush(['employee_number', 'password'])
+        self.env.cr.execute(f"""
+            SELECT e.id, e.name, l.id, l.password
+              FROM hr_employee e
+              LEFT JOIN "{self._table}" l ON l.employee_number = e.id
+             WHERE e.employee_number = %s AND e.active
+             ORDER BY l.id
+             LIMIT 1
+        """, [employee_number])
+        return self.env.cr.fetchone()
+
+    @api.model
+    def _authenticate(self, employee_number, password):
+        """Log an employee in by number and password, registering them on their first login.
+
+        Returns (status, employee id, employee name), status being
+        'unknown_employee', 'wrong_password', 'registered' or 'logged_in'.
+        Costs the lookup, a verify in a hashing slot and one write of a
+        new login token. Raises PasswordHashingBusy.
+        """
+        row = employee_number and self._find_login(employee_number)
+        if not row:
+            return 'unknown_employee', None, None
+        employee_id, employee_name, login_id, password_hash = row
+        if not password:
+            return 'wrong_password', employee_id, employee_name
+        if not login_id:
+            self.create({'employee_number': employee_id, 'password': password})
+            return 'registered', employee_id, employee_name
+
+        valid, new_hash = self._verify(password, password_hash)
+        if not valid:
+            return 'wrong_password', employee_id, employee_name
+        # New token, and the hash re-done with the configured rounds if needed
+        self.env.cr.execute(f"""
+            UPDATE "{self._table}" SET login_token = %s, password = COALESCE(%s, password) WHERE id = %s
+        """, (str(uuid.uuid4()), new_hash, login_id))
+        self.invalidate_cache(['login_token', 'password'], [login_id])
+        return 'logged_in', employee_id, employee_name
+
+    @api.model
+    def _request_password_reset(self, employee_number, hours_valid=1):
+        """Mail a one-time reset link to the employee's work e-mail.
+
+        False when the employee number has no login yet (the first login
+        registers it) or no work e-mail to send the link to.
+        """
+        row = employee_number and self._find_login(employee_number)
+        if not row or not row[2]:
+            return False
+        employee = self.env['hr.employee'].sudo().browse(row[0])
+        if not employee.work_email:
             return False
+        token = self.browse(row[2]).generate_reset_token(hours_valid)
+        base_url = self.env['ir.config_parameter'].sudo().get_param('web.base.url')
+        link = '%s/employee/register?%s' % (base_url, url_encode({
+            'forgot': 1, 'employee_number': employee_number, 'reset_token': token,
+        }))
+        self.env['mail.mail'].sudo().create({
+            'subject': 'Reset your AGB HR password',
+            'email_to': employee.work_email,
+            'body_html': (
+                f'<p>Dear {escape(employee.name)},</p>'
+                f'<p><a href="{escape(link)}">Set a new password</a> within {hours_valid} hour(s).</p>'
+                '<p>If you did not ask for this, ignore this e-mail.</p>'
+            ),
+            'auto_delete': True,
+        })
+        return True
+
+    @api.model
+    def _reset_password(self, employee_number, reset_token, new_password):
+        """Set an employee's password with the token of _request_password_reset; False when it is not valid for them.
+
+        The token is cleared, so a link works once.
+        """
+        row = employee_number and reset_token and self._find_login(employee_number)
+        if not row or not row[2]:
+            return False
+        login = self.browse(row[2])
+        if not login.reset_token or not hmac.compare_digest(login.reset_token, reset_token):
+            return False
+        if not login.validate_reset_token(reset_token):
+            return False
+        login.write({'password': new_password, 'reset_token': False, 'reset_expiration': False})
+        return True
+
+    @api.model
+    def _authenticate_token(self, token):
+        """Employee id of an APK login token, or None."""
+        if not token:
+            return None
+        self.flush(['login_token'])
+        self.env.cr.execute(f'SELECT employee_number FROM "{self._table}" WHERE login_token = %s LIMIT 1', [token])
+        row = self.env.cr.fetchone()
+        return row and row[0]
 
     # -----------------------------
     # Reset token management
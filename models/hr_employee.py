@@ -0,0 +1,36 @@
+import logging
+
+from odoo import models
+from odoo.tools.sql import column_exists
+
+_logger = logging.getLogger(__name__)
+
+
+class HrEmployee(models.Model):
+    _inherit = 'hr.employee'
+
+    def init(self):
+        """Indexes for the login/lookup by employee number and the typeahead search."""
+        cr = self.env.cr
+        has_number = column_exists(cr, self._table, 'employee_number')
+        if has_number:
+            cr.execute(f"""
+                CREATE INDEX IF NOT EXISTS hr_employee_employee_number_idx
+                    ON "{self._table}" (employee_number)
+            """)
+
+        try:
+            with cr.savepoint():
+                cr.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except Exception:
+            _logger.warning("pg_trgm is not available, employee search by partial name will scan the table")
+            return
+        cr.execute(f"""
+            CREATE INDEX IF NOT EXISTS hr_employee_name_trgm_idx
+                ON "{self._table}" USING gin (name gin_trgm_ops)
+        """)
+        if has_number:
+            cr.execute(f"""
+                CREATE INDEX IF NOT EXISTS hr_employee_employee_number_trgm_idx
+                    ON "{self._table}" USING gin (employee_number gin_trgm_ops)
+            """)
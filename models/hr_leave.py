@@ -1,7 +1,234 @@
-from odoo import fields, models
+from datetime import timedelta
+
+from odoo import api, fields, models, tools
+
+from .leave_duration import FULL_WEEK, working_days
+
+# hr.leave fields that change which tracker a leave counts towards, or by how much
+TRACKED_LEAVE_FIELDS = {'state', 'employee_id', 'holiday_status_id', 'request_date_from',
+                        'request_date_to', 'number_of_days', 'active'}
+
+# Leaves a new request may not overlap, nor touch when it is casual leave
+BLOCKING_LEAVE_STATES = ['confirm', 'validate1', 'validate']
+STATE_LABELS = {'confirm': 'Pending', 'validate1': 'Second Approval', 'validate': 'Approved'}
 
 
 class HrLeave(models.Model):
     _inherit = 'hr.leave'
 
-    reason = fields.Char(string='Reason for Leave')
\ No newline at end of file
+    reason = fields.Char(string='Reason for Leave')
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        leaves = super().create(vals_list)
+        leaves._leaves_changed(leaves._get_leave_tracker_keys())
+        return leaves
+
+    def write(self, vals):
+        if not TRACKED_LEAVE_FIELDS.intersection(vals):
+            return super().write(vals)
+        keys = self._get_leave_tracker_keys()
+        res = super().write(vals)
+        self._leaves_changed(keys | self._get_leave_tracker_keys())
+        return res
+
+    def unlink(self):
+        keys = self._get_leave_tracker_keys()
+        res = super().unlink()
+        self._leaves_changed(keys)
+        return res
+
+    def _get_leave_tracker_keys(self):
+        """(employee_id, leave type name, year) of every tracker these leaves count towards."""
+        keys = set()
+        for leave in self:
+            if not leave.employee_id or not leave.holiday_status_id or not leave.request_date_from:
+                continue
+            date_to = leave.request_date_to or leave.request_date_from
+            for year in range(leave.request_date_from.year, date_to.year + 1):
+                keys.add((leave.employee_id.id, leave.holiday_status_id.name, year))
+        return keys
+
+    def _leaves_changed(self, keys):
+        if not keys:
+            return
+        deferred = self.env.context.get('deferred_leave_changes')
+        if deferred is not None:
+            # A bulk action collects the changes and refreshes once at the end
+            deferred.update(keys)
+            return
+        # Summary rows and trackers are refreshed by a cron, outside this transaction
+        self.env['hr.leave.change']._enqueue(keys)
+
+    @api.model
+    def _get_request_duration(self, employee, date_from, date_to, half_day=False):
+        """Working days `employee` requests from date_from to date_to, by their working schedule.
+
+        Weekends and the global holidays of their schedule and company, taken as
+        dates in the schedule's timezone, are excluded; a half-day request counts half of date_from. Served from the cached schedule and holiday bitmaps.
+        """
+        calendar = employee.resource_calendar_id or employee.company_id.resource_calendar_id
+        day_weights = calendar._get_day_weights() if calendar else FULL_WEEK
+        tz = (calendar.tz if calendar else None) or employee.tz or 'UTC'
+        Holidays = self.env['resource.calendar.leaves']
+        holidays = {
+            year: Holidays._get_holiday_bitmap(year, tz, calendar.id, employee.company_id.id)
+            for year in range(date_from.year, date_to.year + 1)
+        }
+        return working_days(date_from, date_to, day_weights, holidays, half_day)
+
+    @api.model
+    def _check_request_range(self, employee, date_from, date_to, leave_type):
+        """Error message if `employee` cannot request leave from date_from to date_to, else None.
+
+        Memoized per (employee, range, leave type) until the employee's leaves
+        change: the cache key holds their version, read from the database, so
+        every worker sees the change.
+        """
+        return self._check_request_range_cached(
+            employee.id, self._get_leaves_version(employee), date_from, date_to, leave_type.id,
+        )
+
+    @api.model
+    @tools.ormcache('employee_id', 'version', 'date_from', 'date_to', 'leave_type_id')
+    def _check_request_range_cached(self, employee_id, version, date_from, date_to, leave_type_id):
+        return self._evaluate_request_range(
+            self.env['hr.employee'].browse(employee_id), date_from, date_to, self.env['hr.leave.type'].browse(leave_type_id),
+        )
+
+    @api.model
+    def _get_leaves_version(self, employee):
+        """Changes whenever one of `employee`'s leaves is created, written or deleted."""
+        # Pending writes get their write_date when flushed
+        self.flush()
+        self.env.cr.execute(
+            'SELECT COUNT(*), MAX(write_date) FROM hr_leave WHERE employee_id = %s', [employee.id],
+        )
+        return self.env.cr.fetchone()
+
+    @api.model
+    def _evaluate_request_range(self, employee, date_from, date_to, leave_type):
+        """Overlap and casual-adjacency rules over one read of [date_from - 1, date_to + 1]."""
+        leaves = self._read_blocking_leaves(employee, date_from - timedelta(days=1), date_to + timedelta(days=1))
+        return self._get_range_error(leaves, date_from, date_to, leave_type.exists().name)
+
+    @api.model
+    def _read_blocking_leaves(self, employee, date_from, date_to):
+        """The employee's pending and approved leaves touching [date_from, date_to], as dicts."""
+        return self.search_read([
+            ('employee_id', '=', employee.id),
+            ('state', 'in', BLOCKING_LEAVE_STATES),
+            ('request_date_from', '<=', date_to),
+            ('request_date_to', '>=', date_from),
+        ], ['request_date_from', 'request_date_to', 'state', 'holiday_status_id'])
+
+    @api.model
+    def _get_range_error(self, leaves, date_from, date_to, leave_type_name):
+        """Error for requesting [date_from, date_to] next to `leaves` (as read by _read_blocking_leaves)."""
+        day_before = date_from - timedelta(days=1)
+        day_after = date_to + timedelta(days=1)
+
+        # --- Overlapping leaves ---
+        errors = []
+        for leave in leaves:
+            if not (leave['request_date_from'] <= date_to and leave['request_date_to'] >= date_from):
+                continue
+            state_label = STATE_LABELS.get(leave['state'], leave['state'])
+            type_name = leave['holiday_status_id'] and leave['holiday_status_id'][1]
+            from_str = leave['request_date_from'].isoformat()
+            to_str = leave['request_date_to'].isoformat()
+            if leave['request_date_from'] == leave['request_date_to']:
+                errors.append(f"Date {from_str} is already taken as {type_name} and it's now in {state_label} state")
+            else:
+                errors.append(f"Date ({from_str} → {to_str}) is already taken as {type_name} and it's now in {state_label} state")
+        if errors:
+            return "; ".join(errors)
+
+        # --- Adjacent leaves, only for casual leave ---
+        if (leave_type_name or '').lower() != 'casual leave':
+            return None
+        adjacency_rules = [
+            ('request_date_to', day_before, "before the requested start date"),
+            ('request_date_from', day_after, "after the requested end date"),
+        ]
+        for field_name, day, position in adjacency_rules:
+            errors = []
+            for leave in leaves:
+                if leave[field_name] != day:
+                    continue
+                type_name = leave['holiday_status_id'] and leave['holiday_status_id'][1]
+                if leave['request_date_from'] == leave['request_date_to']:
+                    errors.append(f"{leave['request_date_from'].strftime('%b %d')} is taken as {type_name}")
+                else:
+                    errors.append(f"{leave['request_date_from'].strftime('%b %d')} to {leave['request_date_to'].strftime('%b %d')} are taken as {type_name}")
+            if errors:
+                return "; ".join(errors) + f" — Casual leave cannot be combined with any other leave {position}"
+        return None
+
+    @api.model
+    def _begin_submission(self, employee, ranges, idempotency_key=None, fingerprint=None):
+        """Lock `employee`'s submissions and check `ranges` against their leaves.
+
+        Returns (stored reply, errors): the reply of an earlier submission with
+        the same idempotency key, or None and the errors of _check_request_ranges.
+        The lock is held until the transaction ends, so the check and the
+        create that follows cannot interleave with another submission of the
+        same employee; other employees are not affected.
+        """
+        self.env['hr.leave.submission.lock'].sudo()._acquire(employee)
+        if idempotency_key:
+            reply = self.env['hr.leave.submission.key']._get_reply(employee, idempotency_key, fingerprint)
+            if reply is not None:
+                return reply, []
+        return None, self._check_request_ranges(employee, ranges)
+
+    @api.model
+    def _check_request_ranges(self, employee, ranges):
+        """Errors (None when valid) for several ranges requested together, in order.
+
+        `ranges` are (date_from, date_to, hr.leave.type record). Each range is
+        checked against the employee's leaves and against the other ranges,
+        over a single read spanning all of them.
+        """
+        if not ranges:
+            return []
+        leaves = self._read_blocking_leaves(
+            employee,
+            min(date_from for date_from, _date_to, _leave_type in ranges) - timedelta(days=1),
+            max(date_to for _date_from, date_to, _leave_type in ranges) + timedelta(days=1),
+        )
+        # The other ranges of the batch count as the pending leaves they are about to become
+        requested = [{
+            'request_date_from': date_from,
+            'request_date_to': date_to,
+            'state': 'confirm',
+            'holiday_status_id': (leave_type.id, leave_type.display_name),
+        } for date_from, date_to, leave_type in ranges]
+
+        errors = []
+        for index, (date_from, date_to, leave_type) in enumerate(ranges):
+            others = leaves + requested[:index] + requested[index + 1:]
+            errors.append(self._get_range_error(others, date_from, date_to, leave_type.name))
+        return errors
+
+
+class HrLeaveType(models.Model):
+    _inherit = 'hr.leave.type'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        leave_types = super().create(vals_list)
+        self.clear_caches()
+        return leave_types
+
+    def write(self, vals):
+        res = super().write(vals)
+        if {'name', 'active'}.intersection(vals):
+            # hr.leave.balance caches leave type ids
+            self.clear_caches()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.clear_caches()
+        return res
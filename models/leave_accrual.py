@@ -0,0 +1,164 @@
+"""Leave accrual arithmetic, free of the ORM.
+
+Everything here takes plain dates and numbers (join date, permanent date,
+as-of date, taken days, carry-in) and returns numbers, so hr.leave.balance
+can evaluate balances in bulk or for any as-of date without touching the
+database. Scalar helpers are memoized; annual_balances() evaluates a whole
+population at once with NumPy when it is installed.
+"""
+from calendar import monthrange
+from datetime import date
+from functools import lru_cache
+
+from dateutil.relativedelta import relativedelta
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CASUAL_DAYS_PER_MONTH = 0.5
+
+# Carried annual leave has to be used by this day, it expires afterwards
+ANNUAL_CARRY_CUTOFF = (6, 30)
+
+ANNUAL_BALANCE_KEYS = ['total', 'total_dynamic', 'accrued_new', 'taken', 'system_taken',
+                       'available', 'carried_forward', 'expired_carried']
+
+
+def carry_cutoff(year):
+    return date(year, *ANNUAL_CARRY_CUTOFF)
+
+
+def is_last_day_of_month(day):
+    return day.day == monthrange(day.year, day.month)[1]
+
+
+@lru_cache(maxsize=4096)
+def count_accrued_months(start_date, as_of):
+    """Months from start_date's month to as_of's month, the last day of a month completing it."""
+    months = (as_of.year - start_date.year) * 12 + (as_of.month - start_date.month)
+    if is_last_day_of_month(as_of):
+        months += 1
+    return max(0, months)
+
+
+def service_date(join_date):
+    """Date from which annual leave starts accruing: one year of service."""
+    return join_date + relativedelta(years=1)
+
+
+def default_permanent_date(join_date, permanent_date=None):
+    """Explicit permanent date, or one year after joining."""
+    if permanent_date:
+        return permanent_date
+    if join_date:
+        return service_date(join_date)
+    return None
+
+
+@lru_cache(maxsize=4096)
+def casual_allocation(permanent_date, as_of):
+    """Casual days allocated for as_of's year: half a day per month from the permanent month."""
+    if not permanent_date or as_of < permanent_date:
+        return 0
+    if permanent_date.year < as_of.year:
+        return 12 * CASUAL_DAYS_PER_MONTH
+    if permanent_date.year == as_of.year:
+        return (12 - permanent_date.month + 1) * CASUAL_DAYS_PER_MONTH
+    return 0
+
+
+@lru_cache(maxsize=4096)
+def annual_accrual_start(join_date, as_of):
+    """First day counted for as_of's annual accrual, or None before one year of service."""
+    if not join_date:
+        return None
+    start = service_date(join_date)
+    if as_of < start:
+        return None
+    return start if as_of.year == start.year else date(as_of.year, 1, 1)
+
+
+def annual_balance(accrued_new, carry_in, taken, as_of, expired_carry=None):
+    """Annual balance from this year's accrual, last year's carry and the days taken.
+
+    Until the carry cutoff the carry is part of the total. After it, the days
+    taken are charged to the carry first and what is left of it expires.
+    `expired_carry` is the amount frozen at the cutoff by the expiry job; when
+    it is given the carry used is fixed instead of following later leaves.
+    """
+    if as_of <= carry_cutoff(as_of.year):
+        total = carry_in + accrued_new
+        carried, expired = carry_in, 0
+        system_taken = taken
+    else:
+        if expired_carry is None:
+            taken_from_carry = min(carry_in, taken)
+            expired = max(carry_in - taken, 0)
+        else:
+            taken_from_carry = min(max(carry_in - expired_carry, 0), taken)
+            expired = expired_carry
+        system_taken = taken - taken_from_carry
+        carried = 0
+        total = accrued_new
+
+    return {
+        'total': total,
+        'total_dynamic': total,
+        'accrued_new': accrued_new,
+        'taken': taken,
+        'system_taken': system_taken,
+        'available': total - system_taken,
+        'carried_forward': carried,
+        'expired_carried': expired,
+    }
+
+
+def annual_balances(join_dates, carry_in, taken, as_of):
+    """annual_balance() for many employees sharing one as-of date.
+
+    Takes parallel sequences and returns a dict of lists keyed like
+    annual_balance(). Employees short of one year of service get zeros.
+    """
+    starts = [annual_accrual_start(join_date, as_of) for join_date in join_dates]
+
+    if np is None:
+        rows = [
+            annual_balance(count_accrued_months(start, as_of), carry, days, as_of)
+            if start else dict.fromkeys(ANNUAL_BALANCE_KEYS, 0)
+            for start, carry, days in zip(starts, carry_in, taken)
+        ]
+        return {key: [row[key] for row in rows] for key in ANNUAL_BALANCE_KEYS}
+
+    eligible = np.array([start is not None for start in starts], dtype=bool)
+    start_months = np.array(
+        [start or as_of for start in starts], dtype='datetime64[D]'
+    ).astype('datetime64[M]')
+    accrued = (np.datetime64(as_of, 'M') - start_months).astype(int)
+    if is_last_day_of_month(as_of):
+        accrued += 1
+    accrued = np.where(eligible, np.maximum(accrued, 0), 0).astype(float)
+    carry = np.where(eligible, np.asarray(carry_in, dtype=float), 0.0)
+    days = np.where(eligible, np.asarray(taken, dtype=float), 0.0)
+
+    if as_of <= carry_cutoff(as_of.year):
+        total = carry + accrued
+        carried, expired = carry, np.zeros_like(carry)
+        system_taken = days
+    else:
+        system_taken = days - np.minimum(carry, days)
+        carried, expired = np.zeros_like(carry), np.maximum(carry - days, 0)
+        total = accrued
+
+    arrays = {
+        'total': total,
+        'total_dynamic': total,
+        'accrued_new': accrued,
+        'taken': days,
+        'system_taken': system_taken,
+        'available': total - system_taken,
+        'carried_forward': carried,
+        'expired_carried': expired,
+    }
+    return {key: values.tolist() for key, values in arrays.items()}
@@ -0,0 +1,66 @@
+import logging
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+
+class HrLeaveChange(models.Model):
+    """(employee, leave type, year) keys touched by hr.leave writes, waiting to be refreshed.
+
+    The hr.leave hooks only insert rows here, so editing or approving a
+    leave never rewrites summary rows or trackers in its own transaction.
+    The cron, triggered on every change, patches the leave summary and the
+    trackers of the queued keys and deletes them.
+    """
+    _name = 'hr.leave.change'
+    _description = 'Leave Change Queue'
+    _order = 'id'
+    _log_access = False
+
+    employee_id = fields.Many2one('hr.employee', required=True, ondelete='cascade')
+    leave_type_name = fields.Char(required=True)
+    year = fields.Integer(required=True)
+
+    @api.model
+    def _enqueue(self, keys):
+        """Queue `keys`, (employee_id, hr.leave.type name, year) tuples, for the refresh cron."""
+        changes = self.sudo().create([{
+            'employee_id': employee_id,
+            'leave_type_name': leave_type_name,
+            'year': year,
+        } for employee_id, leave_type_name, year in keys])
+        # Refresh right after this transaction rather than at the next interval
+        self.env.ref('AGB_HR.ir_cron_process_leave_changes').sudo()._trigger()
+        return changes
+
+    @api.model
+    def _cron_process_changes(self, batch_size=1000):
+        """Refresh the summary rows and trackers of the queued changes, oldest first.
+
+        Rows queued by transactions committed after this one started are left
+        for the next run; SKIP LOCKED lets a second run take the next batch.
+        """
+        self.env.cr.execute(f"""
+            SELECT id, employee_id, leave_type_name, year
+              FROM "{self._table}"
+             ORDER BY id
+             LIMIT %s
+               FOR UPDATE SKIP LOCKED
+        """, [batch_size])
+        rows = self.env.cr.fetchall()
+        if not rows:
+            return
+
+        keys = {(employee_id, leave_type_name, year) for _id, employee_id, leave_type_name, year in rows}
+        # The trackers are recomputed from the summary, patch it first
+        self.env['hr.leave.summary'].sudo()._refresh_employees({key[0] for key in keys})
+        if 'hr.leave.tracker' in self.env:
+            # The trackers come from another module, leaves work without it
+            self.env['hr.leave.balance'].sudo()._refresh_leave_trackers(keys)
+        self.browse([row[0] for row in rows]).unlink()
+        _logger.debug("Leave changes processed: %s keys from %s rows", len(keys), len(rows))
+
+        if len(rows) == batch_size:
+            # More are queued, continue without waiting for the next interval
+            self.env.ref('AGB_HR.ir_cron_process_leave_changes')._trigger()
@@ -0,0 +1,51 @@
+"""Leave durations in working days, free of the ORM.
+
+A year's holidays are an int bitmap, bit n set when day n of the year
+(0 = Jan 1) is a holiday, and a work week is seven day weights, Monday
+first: 1 for a full working day, 0.5 for half of one, 0 for a day off.
+hr.leave builds both from the database once and caches them, so counting
+a range only walks its days.
+"""
+from datetime import date, timedelta
+
+# Monday to Friday, for employees without a working schedule
+FULL_WEEK = (1.0, 1.0, 1.0, 1.0, 1.0, 0.0, 0.0)
+
+
+def holiday_bitmap(year, ranges):
+    """Bitmap of the days of `year` covered by `ranges`, (date_from, date_to) pairs both included."""
+    first_day, last_day = date(year, 1, 1), date(year, 12, 31)
+    bits = 0
+    for date_from, date_to in ranges:
+        date_from, date_to = max(date_from, first_day), min(date_to, last_day)
+        if date_from > date_to:
+            continue
+        bits |= ((1 << ((date_to - date_from).days + 1)) - 1) << (date_from - first_day).days
+    return bits
+
+
+def is_holiday(day, holidays):
+    """Whether `day` is set in `holidays`, a {year: bitmap} dict."""
+    return bool(holidays.get(day.year, 0) >> (day.timetuple().tm_yday - 1) & 1)
+
+
+def working_days(date_from, date_to, day_weights, holidays, half_day=False):
+    """Working days from date_from to date_to, both included.
+
+    Days off in `day_weights` and days set in `holidays` ({year: bitmap})
+    count for nothing. A half-day request only covers date_from and counts
+    half a day when that is a working day.
+    """
+    if half_day:
+        if is_holiday(date_from, holidays):
+            return 0.0
+        return min(day_weights[date_from.weekday()], 0.5)
+
+    days = 0.0
+    day = date_from
+    while day <= date_to:
+        weight = day_weights[day.weekday()]
+        if weight and not is_holiday(day, holidays):
+            days += weight
+        day += timedelta(days=1)
+    return days
@@ -0,0 +1,168 @@
+import logging
+import threading
+from collections import defaultdict
+from datetime import timedelta
+
+from markupsafe import escape
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+MAX_NOTIFICATION_ATTEMPTS = 5
+# Minutes before retry n is 2 ** n: 2, 4, 8, 16
+RETRY_BASE_MINUTES = 2
+
+# ir.config_parameter: minutes first-approval mails wait to be grouped per approver; 0, the default, sends each at once
+DIGEST_WINDOW_PARAM = 'AGB_HR.leave_notification_digest_minutes'
+DEFAULT_DIGEST_MINUTES = 0
+
+
+class HrLeaveNotification(models.Model):
+    """Approval e-mails waiting to be sent for leave requests.
+
+    Submission only queues a row; the cron sends it after the leave is
+    committed, retrying with backoff, so mail problems never roll back or
+    slow down a submission.
+    """
+    _name = 'hr.leave.notification'
+    _description = 'Leave Notification Queue'
+    _order = 'id'
+
+    leave_id = fields.Many2one('hr.leave', required=True, index=True, ondelete='cascade')
+    kind = fields.Selection([('first_approval', 'First Approval')], required=True, default='first_approval')
+    state = fields.Selection([
+        ('queued', 'Queued'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ], required=True, default='queued', index=True)
+    attempts = fields.Integer(default=0)
+    next_attempt = fields.Datetime(default=fields.Datetime.now, index=True)
+    last_error = fields.Text()
+
+    @api.model
+    def _enqueue(self, leaves, kind='first_approval'):
+        vals = {'kind': kind}
+        window = self._get_digest_window()
+        if kind == 'first_approval' and window:
+            # Held for the digest window, later requests to the same approver join the first one's
+            vals['next_attempt'] = fields.Datetime.now() + timedelta(minutes=window)
+        notifications = self.create([dict(vals, leave_id=leave.id) for leave in leaves])
+        # Run the sender right after this transaction rather than at its next interval
+        self.env.ref('AGB_HR.ir_cron_send_leave_notifications').sudo()._trigger()
+        return notifications
+
+    @api.model
+    def _cron_send_notifications(self, batch_size=100):
+        """Send the queued notifications that are due, committing after each one."""
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        notifications = self.search([
+            ('state', '=', 'queued'),
+            ('next_attempt', '<=', fields.Datetime.now()),
+        ], limit=batch_size)
+
+        # Leaves approved, refused or cancelled while their mail waited need no first approval anymore
+        stale = notifications.filtered(lambda n: n.kind == 'first_approval' and n.leave_id.state != 'confirm')
+        if stale:
+            stale.unlink()
+            notifications = notifications.exists()
+
+        sent = failed = 0
+        for batch in self._group_for_sending(notifications):
+            attempts = max(batch.mapped('attempts')) + 1
+            try:
+                with self.env.cr.savepoint():
+                    batch._send()
+                batch.write({'state': 'sent', 'attempts': attempts, 'last_error': False})
+                sent += len(batch)
+            except Exception as e:
+                _logger.exception("Leave notifications %s failed (attempt %s)", batch.ids, attempts)
+                batch.write({
+                    'attempts': attempts,
+                    'last_error': str(e),
+                    'state': 'failed' if attempts >= MAX_NOTIFICATION_ATTEMPTS else 'queued',
+                    'next_attempt': fields.Datetime.now() + timedelta(minutes=RETRY_BASE_MINUTES ** attempts),
+                })
+                failed += len(batch)
+            if auto_commit:
+                self.env.cr.commit()
+
+        if notifications or stale:
+            _logger.info("Leave notifications: %s sent, %s failed, %s dropped", sent, failed, len(stale))
+        if len(notifications) + len(stale) == batch_size:
+            # More are due, continue without waiting for the next interval
+            self.env.ref('AGB_HR.ir_cron_send_leave_notifications')._trigger()
+
+    def _get_digest_window(self):
+        return int(self.env['ir.config_parameter'].sudo().get_param(DIGEST_WINDOW_PARAM, DEFAULT_DIGEST_MINUTES) or 0)
+
+    def _group_for_sending(self, due):
+        """Split the due notifications into batches sent as one mail each.
+
+        With a digest window, the first-approval notifications of one approver
+        go together, including those of theirs still inside the window.
+        """
+        if not self._get_digest_window():
+            return list(due)
+
+        batches = []
+        by_approver = defaultdict(lambda: self.browse())
+        for notification in due:
+            approver = notification.leave_id.first_approver_id
+            if notification.kind != 'first_approval' or not approver:
+                batches.append(notification)
+            else:
+                by_approver[approver] |= notification
+        if by_approver:
+            waiting = self.search([
+                ('state', '=', 'queued'),
+                ('kind', '=', 'first_approval'),
+                ('attempts', '=', 0),
+                ('id', 'not in', due.ids),
+                ('leave_id.state', '=', 'confirm'),
+                ('leave_id.first_approver_id', 'in', [approver.id for approver in by_approver]),
+            ])
+            for notification in waiting:
+                by_approver[notification.leave_id.first_approver_id] |= notification
+        batches.extend(by_approver.values())
+        return batches
+
+    def _send(self):
+        """Send this batch: the usual first-approval mail for one leave, a digest for several."""
+        if len(self) == 1:
+            if self.kind == 'first_approval':
+                self.leave_id._send_first_approval_notification()
+            return
+        self._send_digest()
+
+    def _send_digest(self):
+        """One summary mail to the shared first approver of these notifications' leaves."""
+        leaves = self.mapped('leave_id')
+        approver = leaves[0].first_approver_id
+        email = approver.work_email if approver._name == 'hr.employee' else approver.email
+        if not email:
+            raise ValueError(f"First approver {approver.display_name} has no e-mail address")
+
+        base_url = self.env['ir.config_parameter'].sudo().get_param('web.base.url')
+        rows = ''.join(
+            '<tr><td>{}</td><td>{}</td><td>{} → {}</td><td>{}</td><td>{}</td>'
+            '<td><a href="{}/web#id={}&amp;model=hr.leave&amp;view_type=form">Open</a></td></tr>'.format(
+                escape(leave.employee_id.name), escape(leave.holiday_status_id.name),
+                leave.request_date_from, leave.request_date_to, leave.number_of_days,
+                escape(leave.reason or ''), base_url, leave.id,
+            )
+            for leave in leaves
+        )
+        body = (
+            f'<p>Dear {escape(approver.name)},</p>'
+            f'<p>{len(leaves)} leave requests are waiting for your first approval:</p>'
+            '<table border="1" cellpadding="4" style="border-collapse: collapse;">'
+            '<tr><th>Employee</th><th>Leave Type</th><th>Dates</th><th>Days</th><th>Reason</th><th></th></tr>'
+            f'{rows}</table>'
+        )
+        self.env['mail.mail'].sudo().create({
+            'subject': f'{len(leaves)} leave requests awaiting your approval',
+            'email_to': email,
+            'body_html': body,
+            'auto_delete': True,
+        })
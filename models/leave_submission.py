@@ -0,0 +1,84 @@
+import json
+from datetime import timedelta
+
+from odoo import api, fields, models
+
+# Keys are kept this long; a retry arriving later creates the leave again
+IDEMPOTENCY_KEY_TTL_HOURS = 24
+MAX_IDEMPOTENCY_KEY_LENGTH = 128
+
+
+class HrLeaveSubmissionKey(models.Model):
+    """Replies of leave submissions made with an idempotency key.
+
+    A retried submission carrying the same key (a double tap, or a resend
+    after a timeout) gets the stored reply instead of creating its leaves
+    again. Only successful submissions are stored.
+    """
+    _name = 'hr.leave.submission.key'
+    _description = 'Leave Submission Idempotency Key'
+
+    employee_id = fields.Many2one('hr.employee', required=True, ondelete='cascade')
+    key = fields.Char(required=True)
+    fingerprint = fields.Char(required=True, help="Hash of the submitted fields the key was first used with")
+    response = fields.Text(required=True)
+
+    _sql_constraints = [
+        ('employee_key_uniq', 'unique(employee_id, key)', 'This idempotency key was already used.'),
+    ]
+
+    @api.model
+    def _get_reply(self, employee, key, fingerprint):
+        """Stored reply of `employee`'s submission made with `key`, or None."""
+        record = self.search([('employee_id', '=', employee.id), ('key', '=', key)], limit=1)
+        if not record:
+            return None
+        if record.fingerprint != fingerprint:
+            return {'success': False, 'error': 'Idempotency key already used for a different request'}
+        return json.loads(record.response)
+
+    @api.model
+    def _store_reply(self, employee, key, fingerprint, reply):
+        return self.create({
+            'employee_id': employee.id,
+            'key': key,
+            'fingerprint': fingerprint,
+            'response': json.dumps(reply),
+        })
+
+    @api.autovacuum
+    def _gc_expired_keys(self):
+        self.search([
+            ('create_date', '<', fields.Datetime.now() - timedelta(hours=IDEMPOTENCY_KEY_TTL_HOURS)),
+        ]).unlink()
+
+
+class HrLeaveSubmissionLock(models.Model):
+    """One row per employee, updated by each of their leave submissions.
+
+    Updating the row locks it until the transaction ends, so a second
+    submission of the same employee waits for the first. Requests run at
+    REPEATABLE READ: when the first commits, the waiting update fails to
+    serialize and Odoo retries the request, whose new snapshot includes the
+    first submission's leaves. A submission that finds the row untouched since
+    its snapshot started has seen every committed leave of the employee.
+    """
+    _name = 'hr.leave.submission.lock'
+    _description = 'Leave Submission Lock'
+    _log_access = False
+
+    employee_id = fields.Many2one('hr.employee', required=True, ondelete='cascade')
+    submissions = fields.Integer()
+
+    _sql_constraints = [
+        ('employee_uniq', 'unique(employee_id)', 'A submission lock already exists for this employee.'),
+    ]
+
+    @api.model
+    def _acquire(self, employee):
+        """Lock `employee`'s submissions until the transaction ends; raises SerializationFailure to retry."""
+        self.env.cr.execute(f"""
+            INSERT INTO "{self._table}" AS l (employee_id, submissions)
+            VALUES (%s, 1)
+            ON CONFLICT (employee_id) DO UPDATE SET submissions = l.submissions + 1
+        """, [employee.id])
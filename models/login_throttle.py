@@ -0,0 +1,110 @@
+import logging
+import threading
+from datetime import timedelta
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+# Bucket kind -> (capacity, tokens refilled per second). Every login attempt takes one
+# token from its employee number's bucket and one from its client IP's; the IP bucket
+# is sized for a whole office logging in through one address.
+LOGIN_THROTTLE_BUCKETS = {
+    'employee': (5, 1 / 60),
+    'ip': (200, 2.0),
+}
+
+# Buckets idle this long are full again and are dropped, with their counters
+THROTTLE_IDLE_HOURS = 24
+
+
+class EmployeeLoginThrottle(models.Model):
+    """Token buckets limiting login attempts, shared by every worker.
+
+    One row per key ('employee:<number>' or 'ip:<address>'). A bucket
+    refills continuously up to its capacity; an attempt finding less than
+    one token in any of its buckets is refused. The allowed and rejected
+    counters are the throttling metrics.
+    """
+    _name = 'employee.login.throttle'
+    _description = 'Employee Login Throttle'
+    _log_access = False
+
+    key = fields.Char(required=True)
+    tokens = fields.Float()
+    capacity = fields.Float()
+    rate = fields.Float(help="Tokens refilled per second")
+    updated_at = fields.Datetime()
+    last_allowed = fields.Boolean()
+    allowed_count = fields.Integer()
+    rejected_count = fields.Integer()
+
+    _sql_constraints = [
+        ('key_uniq', 'unique(key)', 'A throttle bucket already exists for this key.'),
+    ]
+
+    @api.model
+    def _consume_login_attempt(self, employee_number, client_ip):
+        """Take a token for a login attempt; seconds to wait when refused, else 0.
+
+        One statement on its own READ COMMITTED cursor, before anything else
+        of the request touches the database: concurrent attempts on a shared
+        key queue on its row instead of failing to serialize, and the count
+        stays even when the request rolls back.
+        """
+        buckets = []
+        if employee_number:
+            buckets.append(('employee:%s' % employee_number,) + LOGIN_THROTTLE_BUCKETS['employee'])
+        if client_ip:
+            buckets.append(('ip:%s' % client_ip,) + LOGIN_THROTTLE_BUCKETS['ip'])
+        if not buckets:
+            return 0
+
+        now = fields.Datetime.now()
+        refilled = "LEAST(EXCLUDED.capacity, t.tokens + EXTRACT(EPOCH FROM (EXCLUDED.updated_at - t.updated_at)) * EXCLUDED.rate)"
+        with self.pool.cursor() as cr:
+            if not getattr(threading.current_thread(), 'testing', False):
+                # Test cursors share the test's transaction, already started
+                cr.execute("SET TRANSACTION ISOLATION LEVEL READ COMMITTED")
+            cr.execute(f"""
+                INSERT INTO "{self._table}" AS t
+                       (key, tokens, capacity, rate, updated_at, last_allowed, allowed_count, rejected_count)
+                VALUES {", ".join(["%s"] * len(buckets))}
+                ON CONFLICT (key) DO UPDATE SET
+                    tokens = CASE WHEN {refilled} >= 1 THEN {refilled} - 1 ELSE {refilled} END,
+                    capacity = EXCLUDED.capacity,
+                    rate = EXCLUDED.rate,
+                    updated_at = EXCLUDED.updated_at,
+                    last_allowed = {refilled} >= 1,
+                    allowed_count = t.allowed_count + ({refilled} >= 1)::int,
+                    rejected_count = t.rejected_count + ({refilled} < 1)::int
+                RETURNING key, last_allowed, tokens, rate
+            """, [(key, capacity - 1, capacity, rate, now, True, 1, 0) for key, capacity, rate in buckets])
+            rows = cr.fetchall()
+
+        refused = [(key, (1 - tokens) / rate) for key, allowed, tokens, rate in rows if not allowed]
+        if not refused:
+            return 0
+        _logger.warning("Login attempt throttled: %s", ", ".join(key for key, _wait in refused))
+        return max(1, int(max(wait for _key, wait in refused) + 1))
+
+    @api.model
+    def _get_metrics(self, limit=20):
+        """Allowed and rejected attempts by bucket kind, and the most throttled keys."""
+        self.env.cr.execute(f"""
+            SELECT split_part(key, ':', 1), SUM(allowed_count), SUM(rejected_count), COUNT(*)
+              FROM "{self._table}" GROUP BY 1
+        """)
+        kinds = {
+            kind: {'allowed': allowed, 'rejected': rejected, 'buckets': count}
+            for kind, allowed, rejected, count in self.env.cr.fetchall()
+        }
+        throttled = self.search_read(
+            [('rejected_count', '>', 0)], ['key', 'allowed_count', 'rejected_count', 'tokens', 'updated_at'],
+            order='rejected_count desc', limit=limit,
+        )
+        return {'kinds': kinds, 'throttled': throttled}
+
+    @api.autovacuum
+    def _gc_idle_buckets(self):
+        self.search([('updated_at', '<', fields.Datetime.now() - timedelta(hours=THROTTLE_IDLE_HOURS))]).unlink()
@@ -0,0 +1,90 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import pytz
+
+from odoo import api, models, tools
+
+from .leave_duration import FULL_WEEK, holiday_bitmap
+
+
+class ResourceCalendar(models.Model):
+    _inherit = 'resource.calendar'
+
+    @tools.ormcache('self.id')
+    def _get_day_weights(self):
+        """Share of a working day worked each weekday, Monday first: 1, 0.5 for a morning or afternoon only, or 0."""
+        periods = defaultdict(set)
+        for attendance in self.attendance_ids:
+            if attendance.display_type or attendance.resource_id:
+                continue
+            periods[int(attendance.dayofweek)].add(attendance.day_period)
+        if not periods:
+            return FULL_WEEK
+        return tuple(min(len(periods[weekday]), 2) / 2 for weekday in range(7))
+
+
+class ResourceCalendarAttendance(models.Model):
+    _inherit = 'resource.calendar.attendance'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        attendances = super().create(vals_list)
+        # resource.calendar caches its day weights
+        self.clear_caches()
+        return attendances
+
+    def write(self, vals):
+        res = super().write(vals)
+        self.clear_caches()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.clear_caches()
+        return res
+
+
+class ResourceCalendarLeaves(models.Model):
+    _inherit = 'resource.calendar.leaves'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        leaves = super().create(vals_list)
+        self.clear_caches()
+        return leaves
+
+    def write(self, vals):
+        res = super().write(vals)
+        if {'date_from', 'date_to', 'resource_id', 'calendar_id', 'company_id'}.intersection(vals):
+            self.clear_caches()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.clear_caches()
+        return res
+
+    @api.model
+    @tools.ormcache('year', 'tz', 'calendar_id', 'company_id')
+    def _get_holiday_bitmap(self, year, tz, calendar_id=False, company_id=False):
+        """Global holidays of `year` as dates in `tz`, as a leave_duration.holiday_bitmap().
+
+        Global means no resource; holidays of another working schedule or
+        another company are left out, those of no schedule or company count.
+        date_from/date_to are stored in UTC: a holiday entered for a local day
+        in Asia/Yangon starts the evening before in UTC.
+        """
+        zone = pytz.timezone(tz or 'UTC')
+        holidays = self.sudo().search_read([
+            ('resource_id', '=', False),
+            ('calendar_id', 'in', [calendar_id, False]),
+            ('company_id', 'in', [company_id, False]),
+            # A day of margin: the local dates may fall in the neighbouring year in UTC
+            ('date_from', '<=', datetime(year, 12, 31, 23, 59, 59) + timedelta(days=1)),
+            ('date_to', '>=', datetime(year, 1, 1) - timedelta(days=1)),
+        ], ['date_from', 'date_to'])
+        return holiday_bitmap(year, [(
+            pytz.utc.localize(holiday['date_from']).astimezone(zone).date(),
+            pytz.utc.localize(holiday['date_to']).astimezone(zone).date(),
+        ) for holiday in holidays])
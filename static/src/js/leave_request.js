@@ -9,6 +9,8 @@ class LeaveRequestForm {
         this.employeeNumber = container.getAttribute('data-employee-number');
         this.employeeName = container.getAttribute('data-employee-name');
         this.timeOffTypes = [];
+        this.upcomingLeaves = [];
+        this.holidays = [];
         this.formData = {
             employee_number: this.employeeNumber,
             holiday_status_id: 0,
@@ -27,12 +29,40 @@ class LeaveRequestForm {
             console.error("Missing employee number.");
             return;
         }
-        await this.loadTimeOffTypes();
-        await this.loadLeaveBalance();
+        // One round trip: types, balances, upcoming leaves and holidays
+        const loaded = await this.loadBootstrap();
+        if (!loaded) {
+            await this.loadTimeOffTypes();
+            await this.loadLeaveBalance();
+        }
         this.renderForm();
         this.setupEventListeners();
     }
 
+    async loadBootstrap() {
+        try {
+            const res = await fetch('/api/leave/bootstrap', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ employee_number: this.employeeNumber })
+            });
+            const response = await res.json();
+            const data = response.result;
+            if (!data || !data.success) {
+                console.warn("⚠️ Failed to load leave form bootstrap, falling back to separate calls");
+                return false;
+            }
+            this.timeOffTypes = data.result.time_off_types || [];
+            this.upcomingLeaves = data.result.upcoming_leaves || [];
+            this.holidays = data.result.holidays || [];
+            this.applyLeaveBalance(data.result.balances);
+            return true;
+        } catch (error) {
+            console.warn("⚠️ Leave form bootstrap error:", error);
+            return false;
+        }
+    }
+
    async loadTimeOffTypes() {
     try {
         const typesResponse = await fetch('/api/time-off-types', {
@@ -55,8 +85,10 @@ class LeaveRequestForm {
         });
 
         const response = await res.json();
-        const data = response.result;
+        this.applyLeaveBalance(response.result);
+    }
 
+    applyLeaveBalance(data) {
         if (data && data.success) {
             const today = new Date();
             const cutoff = new Date(today.getFullYear(), 5, 30); // June 30
@@ -130,6 +162,17 @@ class LeaveRequestForm {
         return;
     }
 
+    // --- Local overlap hint from the bootstrap, saves a round trip ---
+    const knownOverlap = this.findUpcomingOverlap(fromDate, toDate);
+    if (knownOverlap) {
+        this.showNotification(
+            `Date (${knownOverlap.date_from} → ${knownOverlap.date_to}) is already taken as ${knownOverlap.leave_type}`,
+            'error'
+        );
+        this.hasBlockingError = true;
+        return;
+    }
+
     // --- Overlap check (only once) ---
     try {
         const response = await this.checkCasualLeaveOverlap(fromDate, toDate);
@@ -139,6 +182,12 @@ class LeaveRequestForm {
         } else {
             this.hasBlockingError = false; // ✅ clear only if valid
             console.log("✅ No overlapping leave found.");
+            if (response.number_of_days !== undefined) {
+                // Working days as the server counts them (weekends, holidays, shift)
+                this.formData.number_of_days = response.number_of_days;
+                const durationDays = document.getElementById('durationDays');
+                if (durationDays) durationDays.textContent = response.number_of_days;
+            }
         }
     } catch (err) {
         this.showNotification("Network or parsing error: " + err.message, 'error');
@@ -148,12 +197,18 @@ class LeaveRequestForm {
 }
 
 
+    findUpcomingOverlap(fromDate, toDate) {
+        // ISO dates compare correctly as strings
+        return this.upcomingLeaves.find(leave => leave.date_from && leave.date_from <= toDate && leave.date_to >= fromDate);
+    }
+
     async checkCasualLeaveOverlap(fromDate, toDate) {
         const payload = {
             employee_number: this.employeeNumber,
             request_date_from: fromDate,
             request_date_to: toDate,
-            holiday_status_id: this.formData.holiday_status_id
+            holiday_status_id: this.formData.holiday_status_id,
+            half_day: !!document.querySelector('[name="half_day"]')?.checked
         };
 
         // ✅ Use arrow function to preserve 'this'
@@ -0,0 +1 @@
+from . import test_leave_submission
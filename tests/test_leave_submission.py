@@ -0,0 +1,64 @@
+import json
+from datetime import date, timedelta
+
+from odoo.tests import HttpCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestLeaveSubmission(HttpCase):
+
+    def setUp(self):
+        super().setUp()
+        if 'employee_number' not in self.env['hr.employee']._fields:
+            self.skipTest("hr.employee.employee_number comes from another module")
+        self.employee = self.env['hr.employee'].create({
+            'name': 'Submission Tester',
+            'employee_number': 'AGB-SUBMIT-001',
+        })
+        self.leave_type = self.env['hr.leave.type'].create({
+            'name': 'Unpaid Leave',
+            'requires_allocation': 'no',
+        })
+        # A Monday two weeks ahead, away from today's leaves and weekends
+        today = date.today()
+        self.monday = today + timedelta(days=14 - today.weekday())
+
+    def _submit(self, date_from, date_to, headers=None):
+        response = self.url_open('/api/leave-request', data={
+            'employee_number': self.employee.employee_number,
+            'holiday_status_id': self.leave_type.id,
+            'request_date_from': date_from.isoformat(),
+            'request_date_to': date_to.isoformat(),
+            'reason': 'Test',
+        }, headers=headers)
+        return json.loads(response.content)
+
+    def _employee_leaves(self):
+        return self.env['hr.leave'].search([('employee_id', '=', self.employee.id)], order='request_date_from')
+
+    def test_submissions_one_after_the_other(self):
+        first = self._submit(self.monday, self.monday)
+        second = self._submit(self.monday + timedelta(days=1), self.monday + timedelta(days=2))
+
+        self.assertTrue(first['success'], first)
+        self.assertTrue(second['success'], second)
+        leaves = self._employee_leaves()
+        self.assertEqual(len(leaves), 2)
+        self.assertEqual(leaves.mapped('number_of_days'), [1.0, 2.0])
+
+    def test_overlapping_submission_refused(self):
+        first = self._submit(self.monday, self.monday + timedelta(days=1))
+        second = self._submit(self.monday + timedelta(days=1), self.monday + timedelta(days=2))
+
+        self.assertTrue(first['success'], first)
+        self.assertFalse(second['success'])
+        self.assertEqual(len(self._employee_leaves()), 1)
+
+    def test_retry_with_idempotency_key(self):
+        headers = {'Idempotency-Key': 'retry-1'}
+        first = self._submit(self.monday, self.monday, headers=headers)
+        retry = self._submit(self.monday, self.monday, headers=headers)
+
+        self.assertTrue(first['success'], first)
+        self.assertEqual(retry, first)
+        self.assertEqual(len(self._employee_leaves()), 1)